@@ -1,13 +1,19 @@
 import importlib.util
 import importlib
+import asyncio
+from functools import partial
 from .nodes.node import ConfigManager
+from .nodes.client import http_client
+from .nodes.cache import encode_cache, result_cache
+from .nodes.breaker import circuit_breakers
+from .nodes.limiter import request_governor
+from .nodes.memo import memoizer
 from server import PromptServer
 from aiohttp import web
 config_manager = ConfigManager()
 import os
 import subprocess
 import logging
-import requests
 
 routes = PromptServer.instance.routes
 @routes.post('/my_node/set_key')
@@ -38,12 +44,24 @@ async def get_key(request):
     })
 
 
+@routes.get('/my_node/cache_stats')
+async def cache_stats(request):
+    # 结果图片缓存、输入编码缓存和记忆化的命中/淘汰统计
+    return web.json_response({**result_cache.stats(), "encode": encode_cache.stats(), "memo": memoizer.stats()})
+
+@routes.get('/my_node/limiter_stats')
+async def limiter_stats(request):
+    # 各模型的并发上限、在途/排队请求数和平均/最大等待时间，用于按实际数据调整 [LIMITS]；以及各模型的熔断状态
+    return web.json_response({**request_governor.stats(), "breakers": circuit_breakers.stats()})
 
 @routes.get('/my_node/get_user')
 async def get_user(request):
     oneapi_url, oneapi_token = config_manager.get_api_config()
     oneapi_token = oneapi_token[3:]
-    response = requests.get(f"https://mojieaigc.com/api/userinfoo?oneapi_token={oneapi_token}")
+    # 在线程池中请求且不重试：重试的退避等待会阻塞 ComfyUI 的事件循环
+    response = await asyncio.get_running_loop().run_in_executor(
+        None, partial(http_client.get, f"https://mojieaigc.com/api/userinfoo?oneapi_token={oneapi_token}", retry=False)
+    )
     data = response.json()
     print(f"用户信息响应: {data}")
     username = data.get("username", "未知用户")
@@ -62,7 +80,7 @@ async def get_user(request):
 async def get_furniture_styles(request):
     try:
         url = "http://admin.qihuaimage.com/items/furniture_style"
-        response = requests.get(url)
+        response = await asyncio.get_running_loop().run_in_executor(None, partial(http_client.get, url, retry=False))
         response.raise_for_status()
         result = response.json()
         
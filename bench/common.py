@@ -0,0 +1,38 @@
+"""
+基准测试公共工具
+需要在 ComfyUI 的 python 环境中、以 ComfyUI 根目录为当前目录运行，例如：
+    python custom_nodes/comfyui-MJAPI-party/bench/encode_bench.py
+"""
+import os
+import sys
+import time
+import importlib
+import importlib.machinery
+import importlib.util
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_module(name):
+    """
+    以独立包名加载插件 nodes 目录下的模块（避免与 ComfyUI 自带的 nodes.py 重名冲突）
+    :param name: 模块名，如 "base"
+    """
+    if os.getcwd() not in sys.path:
+        sys.path.insert(0, os.getcwd())
+    package = "mjapi_bench_nodes"
+    if package not in sys.modules:
+        spec = importlib.machinery.ModuleSpec(package, None, is_package=True)
+        spec.submodule_search_locations = [os.path.join(PLUGIN_DIR, "nodes")]
+        sys.modules[package] = importlib.util.module_from_spec(spec)
+    return importlib.import_module(f"{package}.{name}")
+
+
+def timeit(func, repeat=5):
+    """执行 repeat 次，返回最短耗时（秒）"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
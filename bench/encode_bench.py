@@ -0,0 +1,104 @@
+"""
+tensor → JPEG base64 编码耗时对比（旧实现 vs ImageConverter.tensor_to_base64）
+输出每百万像素的耗时（ms/MP）、uint8 转换阶段的临时内存峰值，以及整批图片串行/并发编码的耗时
+编码耗时在关闭编码缓存（见 cache.py 的 EncodeCache）的情况下测量，缓存命中的耗时单独列出
+"""
+import time
+import base64
+import tracemalloc
+from io import BytesIO
+
+import numpy as np
+import torch
+from PIL import Image
+
+from common import load_module, timeit
+
+ImageConverter = load_module("base").ImageConverter
+encode_cache = load_module("cache").encode_cache
+
+
+def legacy_tensor_to_base64(image_tensor):
+    """优化前的实现：squeeze → *255 → astype → PIL → 缩放 → JPEG → base64 字符串"""
+    image = image_tensor.squeeze().numpy() * 255.0
+    pil_image = Image.fromarray(image.astype(np.uint8))
+    width, height = pil_image.size
+    if max(width, height) > 4096:
+        scale = 4096 / max(width, height)
+        pil_image = pil_image.resize((int(width * scale), int(height * scale)), Image.LANCZOS)
+    buffered = BytesIO()
+    pil_image.save(buffered, format="JPEG")
+    return base64.b64encode(buffered.getvalue()).decode("utf-8")
+
+
+def peak_mb(func):
+    """numpy 分配的内存峰值（MB）"""
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024 / 1024
+
+
+def sample_image(height, width):
+    """带噪声的渐变图，JPEG 压缩负载接近真实照片"""
+    y = torch.linspace(0, 1, height).view(height, 1, 1)
+    x = torch.linspace(0, 1, width).view(1, width, 1)
+    rgb = torch.cat([x.expand(height, width, 1), y.expand(height, width, 1), (x * y).expand(height, width, 1)], dim=-1)
+    return (rgb + torch.rand(height, width, 3) * 0.05).clamp(0, 1).unsqueeze(0)
+
+
+def cached_times(tensor):
+    """开启编码缓存时的耗时：首次编码（未命中，含内容哈希）与再次传入同一 tensor（命中）"""
+    encode_cache.enabled = True
+    encode_cache._entries.clear()
+    encode_cache._total = 0
+    start = time.perf_counter()
+    ImageConverter.tensor_to_base64(tensor)
+    miss = time.perf_counter() - start
+    hit = timeit(lambda: ImageConverter.tensor_to_base64(tensor))
+    encode_cache.enabled = False
+    return miss, hit
+
+
+def main():
+    torch.manual_seed(0)
+    # 关闭编码缓存，否则重复测量时除第一次外都是缓存命中，测不到编码本身
+    encode_cache.enabled = False
+    sizes = [(1024, 1024), (2048, 2048), (4096, 4096), (4000, 6000)]
+    print("uint8 转换")
+    print(f"{'size':>12} {'legacy ms/MP':>14} {'new ms/MP':>12} {'legacy MB':>10} {'new MB':>8}")
+    for height, width in sizes:
+        tensor = sample_image(height, width)
+        megapixels = height * width / 1e6
+        legacy = lambda: (tensor.squeeze().numpy() * 255.0).astype(np.uint8)
+        new = lambda: ImageConverter.tensor_to_uint8(tensor)
+        print(f"{width:>6}x{height:<5} {timeit(legacy) * 1000 / megapixels:>14.2f} {timeit(new) * 1000 / megapixels:>12.2f}"
+              f" {peak_mb(legacy):>10.1f} {peak_mb(new):>8.1f}")
+
+    print("完整编码（转换 + 缩放 + JPEG + base64）")
+    print(f"{'size':>12} {'legacy ms/MP':>14} {'new ms/MP':>12} {'speedup':>8}")
+    for height, width in sizes:
+        tensor = sample_image(height, width)
+        megapixels = height * width / 1e6
+        legacy = timeit(lambda: legacy_tensor_to_base64(tensor))
+        new = timeit(lambda: ImageConverter.tensor_to_base64(tensor))
+        print(f"{width:>6}x{height:<5} {legacy * 1000 / megapixels:>14.2f} {new * 1000 / megapixels:>12.2f} {legacy / new:>7.2f}x")
+
+    print("编码缓存（同一 tensor 再次编码）")
+    print(f"{'size':>12} {'miss ms/MP':>12} {'hit ms/MP':>12}")
+    for height, width in sizes:
+        tensor = sample_image(height, width)
+        megapixels = height * width / 1e6
+        miss, hit = cached_times(tensor)
+        print(f"{width:>6}x{height:<5} {miss * 1000 / megapixels:>12.2f} {hit * 1000 / megapixels:>12.4f}")
+
+    print("整批编码（8 张 2048x2048）")
+    batch = torch.cat([sample_image(2048, 2048) for _ in range(8)], dim=0)
+    serial = timeit(lambda: ImageConverter.convert_images_to_base64(batch, max_workers=1), repeat=3)
+    threaded = timeit(lambda: ImageConverter.convert_images_to_base64(batch), repeat=3)
+    print(f"串行 {serial * 1000:.0f} ms, 并发 {threaded * 1000:.0f} ms, {serial / threaded:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
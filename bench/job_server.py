@@ -0,0 +1,141 @@
+"""
+异步任务模式的本地替身服务：模拟后端的提交 / 轮询接口，验证 JobClient 的 提交 → 轮询 → 取回结果 流程，
+包括任务进行中、成功、失败、任务不存在（404）以及重启后恢复未完成的任务
+用法: python job_server.py
+"""
+import json
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from common import load_module
+
+
+class JobState:
+    """替身服务的任务表：每个任务先返回一次 pending，之后按 prompt 返回成功或失败"""
+
+    def __init__(self):
+        self.jobs = {}
+        self.posts = 0
+        self.polls = 0
+        self.lock = threading.Lock()
+
+
+class JobHandler(BaseHTTPRequestHandler):
+    state = None
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with self.state.lock:
+            self.state.posts += 1
+            if not payload.get("async"):
+                # 同步接口直接返回结果
+                return self.reply(200, {"data": [{"url": f"sync/{payload['prompt']}"}]})
+            job_id = f"job-{self.state.posts}"
+            self.state.jobs[job_id] = {"prompt": payload["prompt"], "polls": 0}
+        self.reply(200, {"job_id": job_id})
+
+    def do_GET(self):
+        job_id = self.path.rsplit("/", 1)[-1]
+        with self.state.lock:
+            self.state.polls += 1
+            job = self.state.jobs.get(job_id)
+            if job is None:
+                return self.reply(404, {"error": "job not found"})
+            job["polls"] += 1
+            polls = job["polls"]
+        if polls < 2:
+            return self.reply(200, {"status": "pending"})
+        if job["prompt"] == "fail":
+            return self.reply(200, {"status": "failed", "error": "content rejected"})
+        self.reply(200, {"status": "succeeded", "result": {"data": [{"url": f"async/{job['prompt']}"}]}})
+
+
+def start():
+    state = JobState()
+    handler = type("Handler", (JobHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"http://127.0.0.1:{server.server_port}"
+
+
+def check(name, ok):
+    print(f"{'OK  ' if ok else 'FAIL'} {name}")
+    return ok
+
+
+def main():
+    jobs = load_module("jobs")
+    journal_module = load_module("journal")
+    server, state, url = start()
+    api_url = f"{url}/v1/chat/completions"
+    journal = journal_module.JobJournal(os.path.join(tempfile.mkdtemp(), "jobs.sqlite3"))
+    client = jobs.JobClient(enabled=True, status_url=f"{url}/v1/jobs/{{job_id}}", poll_interval=0.05,
+                            max_poll_interval=0.1, journal=journal)
+    headers = {"Content-Type": "application/json"}
+    results = []
+
+    # 提交 → 一次 pending → 成功
+    payload = {"model": "stand-in", "prompt": "cat"}
+    result = client.run(api_url, headers, payload, timeout=10)
+    results.append(check("submit / pending / succeeded", result["data"][0]["url"] == "async/cat" and state.polls == 2))
+
+    # 同一进程内再次执行时照常提交新任务
+    posts = state.posts
+    client.run(api_url, headers, payload, timeout=10)
+    results.append(check("re-run in the same process resubmits", state.posts == posts + 1))
+
+    # 模拟重启：新的日志实例复用一次重启前已完成的结果，之后再执行照常提交
+    journal = journal_module.JobJournal(journal.path)
+    client.journal = journal
+    posts = state.posts
+    client.run(api_url, headers, payload, timeout=10)
+    reused = state.posts == posts
+    client.run(api_url, headers, payload, timeout=10)
+    results.append(check("restart reuses finished job once", reused and state.posts == posts + 1))
+
+    # 任务失败：抛出 RuntimeError，日志记为失败，下次执行重新提交
+    payload = {"model": "stand-in", "prompt": "fail"}
+    try:
+        client.run(api_url, headers, payload, timeout=10)
+        failed = False
+    except RuntimeError as e:
+        failed = "content rejected" in str(e)
+    results.append(check("failed job raises", failed and journal.lookup(journal.payload_hash(payload)) is None))
+
+    # 重启前留下的 pending 任务在服务端已过期（404）：按失败处理，之后重新提交
+    payload = {"model": "stand-in", "prompt": "dog"}
+    key = journal.payload_hash(payload)
+    journal.record(key, journal.PENDING, model="stand-in", job_id="expired")
+    try:
+        client.run(api_url, headers, payload, timeout=10)
+        expired = False
+    except RuntimeError:
+        expired = journal.lookup(key) is None
+    results.append(check("404 on status drops pending job", expired))
+    result = client.run(api_url, headers, payload, timeout=10)
+    results.append(check("next run resubmits", result["data"][0]["url"] == "async/dog"))
+
+    # 未配置 STATUS_URL 时按同步方式请求
+    sync_client = jobs.JobClient(enabled=True, status_url="")
+    result = sync_client.run(api_url, headers, {"model": "stand-in", "prompt": "bird"}, timeout=10)
+    results.append(check("missing STATUS_URL falls back to sync", result["data"][0]["url"] == "sync/bird"))
+
+    server.shutdown()
+    raise SystemExit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+get_right_part_of_image / crop_white_borders 向量化实现与原逐像素实现的结果一致性和耗时对比
+"""
+import numpy as np
+from PIL import Image
+
+from common import load_module, timeit
+
+ImageConverter = load_module("base").ImageConverter
+
+
+def legacy_get_right_part_of_image(img):
+    """优化前的实现：逐像素 getpixel 计算列差异"""
+    width, height = img.size
+    diff_values = []
+    for x in range(1, width):
+        diff = 0
+        for y in range(height):
+            left_pixel = img.getpixel((x - 1, y))
+            right_pixel = img.getpixel((x, y))
+            diff += sum(abs(a - b) for a, b in zip(left_pixel, right_pixel))
+        diff_values.append(diff)
+    split_x = diff_values.index(max(diff_values)) + 1
+    return img.crop((split_x, 0, width, height))
+
+
+def legacy_crop_white_borders(img, tolerance=30):
+    """优化前的实现：逐行检查首尾像素"""
+    width, height = img.size
+    top, bottom = 0, height
+
+    def is_white(pixel):
+        return all(255 - x <= tolerance for x in pixel[:3])
+
+    for y in range(height):
+        if not is_white(img.getpixel((0, y))) or not is_white(img.getpixel((width - 1, y))):
+            top = y
+            break
+    for y in range(height - 1, -1, -1):
+        if not is_white(img.getpixel((0, y))) or not is_white(img.getpixel((width - 1, y))):
+            bottom = y + 1
+            break
+    return img.crop((0, top, width, bottom))
+
+
+def sample_collage(size, rng):
+    """左右拼图，上下带白边"""
+    array = np.full((size, size, 3), 255, dtype=np.uint8)
+    margin = size // 8
+    split = int(size * rng.uniform(0.3, 0.7))
+    array[margin:size - margin, :split] = rng.integers(0, 120, (size - 2 * margin, split, 3))
+    array[margin:size - margin, split:] = rng.integers(130, 250, (size - 2 * margin, size - split, 3))
+    return Image.fromarray(array)
+
+
+def main():
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        img = sample_collage(int(rng.integers(16, 96)), rng)
+        assert np.array_equal(np.asarray(legacy_get_right_part_of_image(img)), np.asarray(ImageConverter.get_right_part_of_image(img)))
+        assert np.array_equal(np.asarray(legacy_crop_white_borders(img)), np.asarray(ImageConverter.crop_white_borders(img)))
+    print("结果一致性检查通过")
+
+    print(f"{'size':>10} {'right_part legacy':>18} {'new':>9} {'crop legacy':>12} {'new':>9}")
+    for size in (256, 512, 1024):
+        img = sample_collage(size, rng)
+        right_legacy = timeit(lambda: legacy_get_right_part_of_image(img), repeat=1)
+        right_new = timeit(lambda: ImageConverter.get_right_part_of_image(img))
+        crop_legacy = timeit(lambda: legacy_crop_white_borders(img))
+        crop_new = timeit(lambda: ImageConverter.crop_white_borders(img))
+        print(f"{size:>5}x{size:<4} {right_legacy * 1000:>16.1f}ms {right_new * 1000:>7.1f}ms"
+              f" {crop_legacy * 1000:>10.2f}ms {crop_new * 1000:>7.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import json
+import time
+import logging
+import threading
+
+import requests
+
+from .config import ConfigManager
+from .deadline import DeadlineExceeded
+
+
+class CircuitBreaker:
+    """
+    单个模型的熔断器
+    连续 failure_threshold 次失败（5xx、超时、连接错误）后打开，打开期间该模型的请求直接失败，不再等待超时；
+    open_seconds 后进入半开状态，只放行一个探测请求：成功则关闭，失败则重新打开并把等待时间加倍（不超过 max_open_seconds）
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, model, failure_threshold=5, open_seconds=60.0, max_open_seconds=600.0):
+        self.model = model
+        self.failure_threshold = max(1, failure_threshold)
+        self.base_open_seconds = open_seconds
+        self.max_open_seconds = max(open_seconds, max_open_seconds)
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self.trips = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """是否放行本次请求；半开状态下只放行一个探测请求"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                logging.info(f"[CircuitBreaker] {self.model} 半开，放行一个探测请求")
+                return True
+            self.rejected += 1
+            return False
+
+    def retry_in(self):
+        """距离下一次探测的秒数"""
+        with self._lock:
+            return max(0.0, self.opened_at + self.open_seconds - time.monotonic())
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logging.info(f"[CircuitBreaker] {self.model} 探测成功，恢复正常")
+            self.state = self.CLOSED
+            self.failures = 0
+            self.open_seconds = self.base_open_seconds
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN:
+                # 探测失败，等待时间加倍
+                self.open_seconds = min(self.open_seconds * 2, self.max_open_seconds)
+            elif self.failures < self.failure_threshold:
+                return
+            if self.state != self.OPEN:
+                self.trips += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._probing = False
+            logging.warning(f"[CircuitBreaker] {self.model} 连续失败 {self.failures} 次，熔断 {self.open_seconds:.0f} 秒")
+
+    def release(self):
+        """本次请求没有得到后端的结果（如本地预算用完），不计入成功或失败；半开时允许再放行一个探测请求"""
+        with self._lock:
+            self._probing = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "trips": self.trips,
+                "rejected": self.rejected,
+                "open_seconds": self.open_seconds,
+            }
+
+
+class CircuitBreakers:
+    """按模型名管理熔断器，所有节点共享"""
+
+    def __init__(self, enabled=True, failure_threshold=5, open_seconds=60.0, max_open_seconds=600.0):
+        self.enabled = enabled
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config_manager=None):
+        config_manager = config_manager or ConfigManager()
+        return cls(**config_manager.get_breaker_config())
+
+    def get(self, model):
+        """获取模型的熔断器，未启用或没有模型名时返回 None"""
+        if not self.enabled or not model:
+            return None
+        breaker = self._breakers.get(model)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(
+                    model, CircuitBreaker(model, self.failure_threshold, self.open_seconds, self.max_open_seconds)
+                )
+        return breaker
+
+    @staticmethod
+    def is_failure(response=None, error=None):
+        """
+        5xx、网络超时和连接错误视为后端故障；4xx 是请求本身的问题，不计入
+        本地预算用完（DeadlineExceeded，可能只是在限流队列中等待过久）也不计入
+        """
+        if error is not None:
+            if isinstance(error, DeadlineExceeded):
+                return False
+            return isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError))
+        return response is not None and response.status_code >= 500
+
+    @staticmethod
+    def open_response(breaker, url):
+        """
+        熔断期间直接返回的 503 响应，节点按原有的错误处理流程生成错误图片
+        响应体的 error 字段即错误图片上的文字
+        """
+        response = requests.Response()
+        response.status_code = 503
+        response.url = url
+        response.reason = "Circuit Open"
+        response.headers["Content-Type"] = "application/json"
+        response.headers["X-Circuit-Open"] = "1"
+        message = f"模型 {breaker.model} 暂时不可用，约 {breaker.retry_in():.0f} 秒后自动重试 (Service unavailable)"
+        response._content = json.dumps({"error": message}, ensure_ascii=False).encode("utf-8")
+        response.encoding = "utf-8"
+        return response
+
+    def stats(self):
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {model: breaker.stats() for model, breaker in breakers.items()}
+
+
+# 进程级共享实例
+circuit_breakers = CircuitBreakers.from_config()
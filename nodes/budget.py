@@ -0,0 +1,115 @@
+import math
+
+from .config import ConfigManager
+
+# 各模型输入图片的尺寸/体积预算和编码策略，编码前自动应用，只上传模型实际会用到的像素
+#   max_side:      长边上限，超过则等比缩小
+#   min_side:      短边下限，不足则等比放大（放大后仍受 max_side 限制）
+#   max_pixels:    总像素上限，超过则等比缩小
+#   max_bytes:     单张图片编码后（base64 之前）的硬性体积上限，质量降到下限仍超出时继续缩小尺寸
+#   format:        jpeg / webp / png（服务端需支持对应格式）
+#   quality:       初始编码质量；min_quality: 为满足体积目标可降到的最低质量
+#   subsampling:   JPEG 色度抽样，4:4:4 保留完整色度（文字、细线），4:2:0 体积更小
+#   target_bytes:  单张图片的体积目标，超出时依次降色度抽样、降质量、（允许时）改用 WebP
+#   webp_fallback: JPEG 降到最低质量仍超出目标时是否改用 WebP
+#   lossless:      无损编码（遮罩/透明通道需要精确保留时使用）
+#   mask_format:   图像 + 遮罩的传输格式（legacy / rgba / separate），见 ImageConverter.encode_masked_image
+# 未列出的模型使用 "default"；config.ini 的 [UPLOAD_ENCODING] 和 [UPLOAD_ENCODING:模型名] 可覆盖
+MODEL_INPUT_BUDGETS = {
+    "default": {
+        "max_side": 4096,
+        "format": "jpeg",
+        "quality": 75,
+        "min_quality": 60,
+        "subsampling": "4:2:0",
+        "webp_fallback": False,
+        "lossless": False,
+        "mask_format": "legacy",
+    },
+    # 图片翻译需要保留文字边缘的色度
+    "image_translate": {"subsampling": "4:4:4"},
+    # 抠图/迁移节点的遮罩需要精确保留
+    "auto_koutu_1.0": {"lossless": True},
+    "Product_migrate_mjAPI": {"lossless": True},
+    # 服务端只接受 256~2048 的输入
+    "image_upscale": {"min_side": 256, "max_side": 2048},
+    # 细节类模型要求宽高在 1280~4096 之间
+    "detail-photo": {"min_side": 1280, "max_side": 4096},
+    "detail-jin": {"min_side": 1280, "max_side": 4096},
+    # 多图参考模型，参考图长边 1280 已足够
+    "nano-banana-pro": {"max_side": 1280},
+    "Gemini2.5-image-Nanobanana": {"max_side": 1280},
+    "Gemini3-image-Nanobanana-pro": {"max_side": 1280},
+    "Gemini3.1-flash-image-preview": {"max_side": 1280},
+    "gpt-5.4-image-2": {"max_side": 1280},
+    # 参考图超过约 4MP 会被服务端缩小
+    "flux2": {"max_side": 4096, "max_pixels": 2048 * 2048},
+    # 单张参考图不超过 10MB
+    "doubao-seedream-4.5": {"max_side": 4096, "max_bytes": 10 * 1024 * 1024},
+    # 输入宽高不超过 3072，单张不超过 10MB
+    "qwen-image-edit": {"max_side": 3072, "max_bytes": 10 * 1024 * 1024},
+}
+
+
+_config_policies, _upload_config = ConfigManager().get_upload_encoding_config()
+
+
+def get_budget(model=None):
+    """
+    获取模型的输入预算，未列出的模型返回默认预算
+    优先级：代码默认 < config 默认 < 代码中的模型配置 < config 中的模型配置
+    :param model: payload 中的 model 名称
+    :return: 预算字典
+    """
+    budget = dict(MODEL_INPUT_BUDGETS["default"])
+    budget.update(_config_policies.get("default", {}))
+    budget.update(MODEL_INPUT_BUDGETS.get(model, {}))
+    budget.update(_config_policies.get(model, {}))
+    return budget
+
+
+def upload_target_bytes(budget, share=1):
+    """
+    单张图片的体积目标：取 target_bytes 和按上传带宽/时间预算折算值中较小的一个
+    :param budget: get_budget 返回的预算
+    :param share: 同一请求中分摊上传时间预算的图片数量
+    :return: 字节数，None 表示不限制
+    """
+    targets = []
+    if budget.get("target_bytes"):
+        targets.append(budget["target_bytes"])
+    if _upload_config["upload_kbps"] > 0 and _upload_config["upload_seconds"] > 0:
+        wire_bytes = _upload_config["upload_kbps"] * 1000 / 8 * _upload_config["upload_seconds"]
+        # base64 会把体积放大 4/3
+        targets.append(int(wire_bytes * 3 / 4 / max(1, share)))
+    return min(targets) if targets else None
+
+
+def fit_size(width, height, budget):
+    """
+    计算满足预算的目标尺寸（等比缩放）
+    :param width: 原始宽度
+    :param height: 原始高度
+    :param budget: get_budget 返回的预算
+    :return: (new_width, new_height)，无需缩放时返回原尺寸
+    """
+    scale = 1.0
+    min_side = budget.get("min_side")
+    if min_side and min(width, height) < min_side:
+        scale = min_side / min(width, height)
+
+    max_side = budget.get("max_side")
+    if max_side and max(width, height) * scale > max_side:
+        scale = max_side / max(width, height)
+
+    max_pixels = budget.get("max_pixels")
+    if max_pixels and width * height * scale * scale > max_pixels:
+        scale = math.sqrt(max_pixels / (width * height))
+
+    if scale == 1.0:
+        return width, height
+    # 四舍五入保证缩放后的边恰好落在上下限上，再次 fit_size 时不会重复缩放
+    new_width, new_height = round(width * scale), round(height * scale)
+    if max_pixels and new_width * new_height > max_pixels:
+        new_width, new_height = int(width * scale), int(height * scale)
+    return max(1, new_width), max(1, new_height)
@@ -0,0 +1,406 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlsplit
+
+import torch
+
+from .client import http_client
+from .config import ConfigManager
+
+
+class VideoCache:
+    """
+    视频文件缓存目录
+    下载内容按 sha256 命名（内容寻址），流式写入临时文件后原子重命名，多个节点/多个 prompt 之间不会互相覆盖；
+    同一 URL 再次执行时直接复用已下载的文件；按总大小和存放时间淘汰旧文件。
+    """
+
+    VIDEO_EXTS = (".mp4", ".mov", ".webm", ".mkv", ".avi")
+    # 最近使用过的文件可能仍被 VideoFromFile 引用，淘汰时跳过
+    IN_USE_GRACE = 600
+
+    def __init__(self, directory, max_bytes=2048 * 1024 * 1024, max_age=72 * 3600, chunk_size=1024 * 1024):
+        """
+        :param directory: 缓存目录
+        :param max_bytes: 缓存总大小上限（字节）
+        :param max_age: 文件最长保留时间（秒）
+        :param chunk_size: 流式下载的块大小（字节）
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self._index_path = os.path.join(directory, "index.json")
+        self._index = None
+
+    @classmethod
+    def from_config(cls, config_manager=None):
+        config_manager = config_manager or ConfigManager()
+        directory = os.path.join(config_manager.get_cache_dir(), "videos")
+        return cls(directory, **config_manager.get_video_cache_config())
+
+    def _load_index(self):
+        if self._index is None:
+            try:
+                with open(self._index_path, "r", encoding="utf-8") as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _save_index(self):
+        tmp_path = f"{self._index_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self._index_path)
+
+    @staticmethod
+    def url_key(url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def lookup(self, url):
+        """返回 URL 已缓存的本地路径，未缓存时返回 None"""
+        with self._lock:
+            name = self._load_index().get(self.url_key(url))
+        if not name:
+            return None
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            return None
+        os.utime(path)  # 刷新访问时间，供淘汰判断
+        return path
+
+    def fetch(self, url):
+        """获取 URL 对应的视频文件路径，未缓存时下载"""
+        path = self.lookup(url)
+        if path:
+            logging.info(f"[VideoCache] 命中缓存: {path}")
+            return path
+
+        os.makedirs(self.directory, exist_ok=True)
+        ext = os.path.splitext(urlsplit(url).path)[1].lower()
+        ext = ext if ext in self.VIDEO_EXTS else ".mp4"
+        tmp_path = os.path.join(self.directory, f".{uuid.uuid4().hex}.part")
+        digest = hashlib.sha256()
+        try:
+            # with 保证响应关闭后连接归还连接池
+            with http_client.get(url, stream=True) as response:
+                if response.status_code != 200:
+                    raise ValueError(f"下载视频失败: {response.status_code}")
+                with open(tmp_path, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        digest.update(chunk)
+                        f.write(chunk)
+            name = f"{digest.hexdigest()}{ext}"
+            path = os.path.join(self.directory, name)
+            if os.path.exists(path):
+                # 相同内容已存在（文件可能正被引用），保留原文件
+                os.remove(tmp_path)
+                os.utime(path)
+            else:
+                os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        with self._lock:
+            self._load_index()[self.url_key(url)] = name
+            self._save_index()
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep=None):
+        """删除过期文件，并按最近使用时间淘汰直到总大小不超过上限"""
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith(".") or name == "index.json" or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, name, path))
+        entries.sort()
+        total = sum(size for _, size, _, _ in entries)
+        removed = set()
+        for mtime, size, name, path in entries:
+            if path == keep or now - mtime < self.IN_USE_GRACE:
+                continue
+            if now - mtime > self.max_age or total > self.max_bytes:
+                try:
+                    os.remove(path)
+                    total -= size
+                    removed.add(name)
+                except OSError:
+                    pass
+        if removed:
+            with self._lock:
+                index = self._load_index()
+                for key in [k for k, v in index.items() if v in removed]:
+                    del index[key]
+                self._save_index()
+            logging.info(f"[VideoCache] 淘汰 {len(removed)} 个缓存视频")
+
+
+# 进程级共享实例
+video_cache = VideoCache.from_config()
+
+
+class ResultCache:
+    """
+    结果图片的磁盘 LRU 缓存
+    按结果 URL 保存 CDN 返回的原始字节（原始 JPEG/PNG，不保存解码后的 tensor），
+    接口再次返回同一地址时直接读取本地文件；是否跳过接口请求由 [MEMO] 的记忆化决定。
+    """
+
+    def __init__(self, directory, enabled=True, max_bytes=1024 * 1024 * 1024):
+        """
+        :param directory: 缓存目录
+        :param enabled: 是否启用
+        :param max_bytes: 缓存总大小上限（字节），超过后淘汰最久未使用的文件
+        """
+        self.directory = directory
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_config(cls, config_manager=None):
+        config_manager = config_manager or ConfigManager()
+        directory = os.path.join(config_manager.get_cache_dir(), "results")
+        return cls(directory, **config_manager.get_result_cache_config())
+
+    def _path(self, url):
+        return os.path.join(self.directory, hashlib.sha256(url.encode("utf-8")).hexdigest())
+
+    def _ensure_total(self):
+        if self._total is None:
+            self._total = 0
+            if os.path.isdir(self.directory):
+                for entry in os.scandir(self.directory):
+                    if entry.is_file() and not entry.name.startswith("."):
+                        self._total += entry.stat().st_size
+        return self._total
+
+    def get(self, url):
+        """按 URL 读取缓存的原始字节，未命中返回 None"""
+        if not self.enabled:
+            return None
+        path = self._path(url)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # 刷新最近使用时间
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, url, data):
+        """写入原始字节或字节块列表（先写临时文件再原子重命名）"""
+        if not self.enabled:
+            return
+        chunks = [data] if isinstance(data, (bytes, bytearray, memoryview)) else list(data)
+        size = sum(len(chunk) for chunk in chunks)
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(url)
+        tmp_path = os.path.join(self.directory, f".{uuid.uuid4().hex}.part")
+        try:
+            with open(tmp_path, "wb") as f:
+                f.writelines(chunks)
+            existed = os.path.exists(path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"[ResultCache] 写入缓存失败: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        with self._lock:
+            if not existed:
+                self._total = self._ensure_total() + size
+            over = self._total > self.max_bytes
+        if over:
+            self.evict()
+
+    def evict(self):
+        """按最近使用时间淘汰，直到总大小不超过上限"""
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and not entry.name.startswith("."):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            entries.sort()
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                    self.evictions += 1
+                except OSError:
+                    pass
+            self._total = total
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "bytes": self._ensure_total(),
+                "max_bytes": self.max_bytes,
+            }
+
+
+# 进程级共享实例
+result_cache = ResultCache.from_config()
+
+
+class EncodeCache:
+    """
+    输入图片编码结果（base64）的内存 LRU 缓存
+    以 tensor 内容哈希 + 编码参数为键，固定参考图反复执行时不再重复 JPEG/base64 编码；
+    同一个 tensor 对象（未被原地修改）再次传入时连内容哈希也会跳过。
+    """
+
+    def __init__(self, enabled=True, max_bytes=256 * 1024 * 1024):
+        """
+        :param enabled: 是否启用
+        :param max_bytes: 缓存的编码结果总大小上限（字节）
+        """
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._total = 0
+        # (id(底层 tensor), 偏移, 形状, 步长, dtype) -> (弱引用, 版本号, 内容哈希)
+        self._identities = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_config(cls, config_manager=None):
+        config_manager = config_manager or ConfigManager()
+        return cls(**config_manager.get_encode_cache_config())
+
+    def tensor_key(self, tensor):
+        """计算 tensor 内容哈希；同一未修改的 tensor（或同一切片视图）再次传入时直接复用上次的哈希"""
+        base = tensor._base if tensor._base is not None else tensor
+        ident = (id(base), tensor.storage_offset(), tuple(tensor.shape), tensor.stride(), str(tensor.dtype))
+        with self._lock:
+            known = self._identities.get(ident)
+            if known is not None and known[0]() is base and known[1] == tensor._version:
+                return known[2]
+
+        data = tensor.detach().cpu().contiguous()
+        if data.dtype == torch.bfloat16:
+            data = data.float()
+        digest = hashlib.sha1(f"{data.dtype}:{tuple(data.shape)}:".encode())
+        digest.update(memoryview(data.numpy()).cast("B"))
+        key = digest.hexdigest()
+
+        try:
+            ref = weakref.ref(base, lambda _, ident=ident: self._forget(ident))
+        except TypeError:
+            return key
+        with self._lock:
+            self._identities[ident] = (ref, tensor._version, key)
+        return key
+
+    def _forget(self, ident):
+        # 在 GC 回调中执行，不能加锁（可能与持锁线程是同一线程）
+        known = self._identities.get(ident)
+        if known is not None and known[0]() is None:
+            self._identities.pop(ident, None)
+
+    def _key_part(self, value):
+        if isinstance(value, torch.Tensor):
+            return self.tensor_key(value)
+        # ImageHandle 等自带缓存键的对象
+        if hasattr(value, "cache_key"):
+            return value.cache_key(self)
+        return repr(value)
+
+    def make_key(self, name, args, kwargs):
+        parts = [name] + [self._key_part(value) for value in args]
+        parts += [f"{key}={self._key_part(value)}" for key, value in sorted(kwargs.items())]
+        return "|".join(parts)
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total -= len(old)
+            self._entries[key] = value
+            self._total += size
+            while self._total > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._total -= len(evicted)
+
+    def cached(self, func):
+        """
+        编码函数装饰器：参数中的 tensor 按内容哈希，其余参数按 repr 组成键
+        编码函数必须是纯函数（结果只取决于参数）
+        """
+        name = func.__qualname__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return func(*args, **kwargs)
+            key = self.make_key(name, args, kwargs)
+            value = self.get(key)
+            if value is None:
+                value = func(*args, **kwargs)
+                self.put(key, value)
+            return value
+
+        return wrapper
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._total,
+                "max_bytes": self.max_bytes,
+            }
+
+
+# 进程级共享实例
+encode_cache = EncodeCache.from_config()
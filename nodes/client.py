@@ -0,0 +1,174 @@
+import threading
+import logging
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .breaker import circuit_breakers
+from .config import ConfigManager
+from .deadline import DeadlineExceeded, deadline_policy
+from .limiter import request_governor
+from .retry import RetryPolicy, retry_policy
+
+
+class HttpClient:
+    """
+    共享的 HTTP 客户端
+    按 scheme://host 维护 keep-alive 的 Session 连接池，所有节点和所有 prompt 执行之间复用连接，
+    避免每次提交和每次下载结果都重新进行 TCP+TLS 握手
+    """
+
+    def __init__(self, pool_connections=4, pool_maxsize=16, pool_block=True, host_pool_maxsize=None):
+        """
+        :param pool_connections: 每个 Session 缓存的连接池数量
+        :param pool_maxsize: 每个主机的最大连接数
+        :param pool_block: 连接数达到上限时是否等待空闲连接（True 时严格限制单主机连接数）
+        :param host_pool_maxsize: 按主机覆盖最大连接数，如 {"mojieaigc.com": 32}
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.host_pool_maxsize = host_pool_maxsize or {}
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config_manager=None):
+        config_manager = config_manager or ConfigManager()
+        return cls(**config_manager.get_http_config())
+
+    @staticmethod
+    def host_key(url):
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}".lower()
+
+    def _pool_size_for(self, netloc):
+        host = netloc.split(":")[0]
+        # 支持精确匹配和父域名匹配（www.mojieaigc.com 命中 mojieaigc.com）
+        for name, size in self.host_pool_maxsize.items():
+            if host == name or host.endswith("." + name):
+                return size
+        return self.pool_maxsize
+
+    def _new_session(self, url):
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self._pool_size_for(urlsplit(url).netloc.lower()),
+            pool_block=self.pool_block,
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def session_for(self, url):
+        """获取该 URL 所属主机的 Session，不存在则创建"""
+        key = self.host_key(url)
+        session = self._sessions.get(key)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(key)
+                if session is None:
+                    session = self._new_session(url)
+                    self._sessions[key] = session
+                    logging.info(f"[HttpClient] 新建连接池: {key}")
+        return session
+
+    def request(self, method, url, retry=None, model=None, group=None, **kwargs):
+        """
+        发送请求，按统一重试策略处理可重试的错误（见 retry.py）
+        带 model 的 API 请求（json payload 中的 model，或显式传入）每次发送前经过全局限速和按模型的并发上限（见 limiter.py），
+        该模型熔断期间直接返回 503 响应，不再发出请求（见 breaker.py）
+        超时分为连接/读取两部分：API 请求按模型和分辨率查表，其余请求未指定 timeout 时使用下载超时；
+        每次尝试的超时都按当前预算范围的剩余时间收紧，重试不会超出截止时间（见 deadline.py）
+
+        :param retry: RetryPolicy；None 使用默认策略，False 不重试（调用方自行重试时使用）
+        :param model: 并发上限使用的模型名，默认取 json payload 中的 model
+        :param group: 模型组名（如 "video"），模型本身未单独配置并发上限时使用
+        """
+        session = self.session_for(url)
+        payload = kwargs.get("json")
+        if model is None and isinstance(payload, dict):
+            model = payload.get("model")
+        timeout = kwargs.pop("timeout", None)
+        if model is not None:
+            timeout, deadline = deadline_policy.request_timeout(model, payload, timeout)
+        elif timeout is None:
+            timeout, deadline = deadline_policy.download_timeout()
+        else:
+            deadline = None
+
+        def attempt():
+            # 每次尝试按剩余预算收紧超时（重试前的退避等待计入预算，排队等待名额不计入）
+            kwargs["timeout"] = deadline.timeout(*timeout) if deadline is not None else timeout
+            try:
+                return session.request(method, url, **kwargs)
+            except requests.exceptions.Timeout as e:
+                if isinstance(e, DeadlineExceeded) or deadline is None or deadline.remaining() > 0.05:
+                    raise
+                # 超时是按剩余预算收紧后触发的：本地预算用完，不是后端故障，熔断和并发控制都不计入
+                raise DeadlineExceeded(f"{method} {url} 超出 {deadline.seconds:.0f} 秒的总时间预算") from e
+
+        def send():
+            if model is None and group is None:
+                return attempt()
+            # 每次尝试单独占用名额，重试前的退避等待不占用并发
+            with request_governor.slot(model, group) as outcome:
+                if deadline is not None:
+                    # 排队等待并发名额和令牌的时间不计入预算
+                    deadline.extend(outcome["waited"])
+                try:
+                    response = attempt()
+                except DeadlineExceeded:
+                    raise
+                except requests.exceptions.Timeout:
+                    outcome["timed_out"] = True
+                    raise
+                # 状态码和耗时反馈给并发控制，用于自动调整上限
+                outcome["status"] = response.status_code
+                return response
+
+        breaker = circuit_breakers.get(model)
+        if breaker is not None and not breaker.allow():
+            return circuit_breakers.open_response(breaker, url)
+
+        try:
+            if retry is False:
+                response = send()
+            else:
+                idempotent = method.upper() in RetryPolicy.IDEMPOTENT_METHODS
+                response = (retry or retry_policy).call(send, idempotent=idempotent, description=f"{method} {url}",
+                                                        deadline=deadline)
+        except Exception as e:
+            if breaker is not None:
+                if isinstance(e, DeadlineExceeded):
+                    # 本地预算用完（可能只是排队过久），不代表后端故障
+                    breaker.release()
+                elif circuit_breakers.is_failure(error=e):
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+            raise
+        if breaker is not None:
+            if circuit_breakers.is_failure(response=response):
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+# 进程级共享实例，节点之间复用
+http_client = HttpClient.from_config()
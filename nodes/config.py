@@ -6,13 +6,183 @@ class ConfigManager:
         self.config = configparser.ConfigParser()
         current_dir = os.path.dirname(os.path.abspath(__file__))
         config_path = os.path.join(os.path.dirname(current_dir), 'config.ini')
-        self.config.read(config_path)
+        self.config.read(config_path, encoding='utf-8')
 
     def get_api_config(self):
         oneapi_url = self.config.get('API', 'BASE_URL')
         oneapi_token = self.config.get('API', 'KEY')
         return oneapi_url, oneapi_token
 
+    def get_http_config(self):
+        """读取连接池配置，缺省项使用默认值（兼容旧版config.ini）"""
+        host_limits = {}
+        raw = self.config.get('HTTP', 'HOST_POOL_MAXSIZE', fallback='')
+        # 格式: host=数量,host=数量
+        for item in raw.split(','):
+            if '=' not in item:
+                continue
+            host, size = item.split('=', 1)
+            if host.strip() and size.strip().isdigit():
+                host_limits[host.strip().lower()] = int(size.strip())
+        return {
+            "pool_connections": self.config.getint('HTTP', 'POOL_CONNECTIONS', fallback=4),
+            "pool_maxsize": self.config.getint('HTTP', 'POOL_MAXSIZE', fallback=16),
+            "pool_block": self.config.getboolean('HTTP', 'POOL_BLOCK', fallback=True),
+            "host_pool_maxsize": host_limits,
+        }
+
+    def get_download_config(self):
+        """读取结果图下载配置"""
+        return {
+            "workers": self.config.getint('DOWNLOAD', 'WORKERS', fallback=8),
+            "retries": self.config.getint('DOWNLOAD', 'RETRIES', fallback=3),
+        }
+
+    def get_retry_config(self):
+        """读取统一重试策略配置"""
+        return {
+            "max_attempts": self.config.getint('RETRY', 'MAX_ATTEMPTS', fallback=4),
+            "base_delay": self.config.getfloat('RETRY', 'BASE_DELAY', fallback=1.0),
+            "max_delay": self.config.getfloat('RETRY', 'MAX_DELAY', fallback=30.0),
+            "max_elapsed": self.config.getfloat('RETRY', 'MAX_ELAPSED', fallback=120.0),
+        }
+
+    def get_limiter_config(self):
+        """读取全局限速和按模型并发上限配置"""
+        limits = {}
+        raw = self.config.get('LIMITS', 'CONCURRENCY', fallback='')
+        # 格式: 模型名=数量,组名=数量
+        for item in raw.split(','):
+            if '=' not in item:
+                continue
+            name, size = item.rsplit('=', 1)
+            if name.strip() and size.strip().isdigit():
+                limits[name.strip()] = int(size.strip())
+        return {
+            "rate": self.config.getfloat('LIMITS', 'RATE', fallback=0.0),
+            "burst": self.config.getint('LIMITS', 'BURST', fallback=10),
+            "limits": limits,
+            "default_limit": self.config.getint('LIMITS', 'DEFAULT_CONCURRENCY', fallback=0),
+            "adaptive": self.config.getboolean('LIMITS', 'ADAPTIVE', fallback=False),
+            "min_limit": self.config.getint('LIMITS', 'MIN_CONCURRENCY', fallback=1),
+            "max_limit": self.config.getint('LIMITS', 'MAX_CONCURRENCY', fallback=32),
+            "spike_factor": self.config.getfloat('LIMITS', 'LATENCY_SPIKE', fallback=0.0),
+        }
+
+    def get_breaker_config(self):
+        """读取按模型熔断配置"""
+        return {
+            "enabled": self.config.getboolean('CIRCUIT_BREAKER', 'ENABLED', fallback=True),
+            "failure_threshold": self.config.getint('CIRCUIT_BREAKER', 'FAILURE_THRESHOLD', fallback=5),
+            "open_seconds": self.config.getfloat('CIRCUIT_BREAKER', 'OPEN_SECONDS', fallback=60.0),
+            "max_open_seconds": self.config.getfloat('CIRCUIT_BREAKER', 'MAX_OPEN_SECONDS', fallback=600.0),
+        }
+
+    def get_timeout_config(self):
+        """读取连接/读取/下载超时配置，未填写的项使用 deadline.py 中的默认值"""
+        defaults, download = {}, {}
+        if self.config.has_option('TIMEOUTS', 'CONNECT'):
+            defaults["connect"] = self.config.getfloat('TIMEOUTS', 'CONNECT')
+        for key in ("connect", "read", "total"):
+            option = f"DOWNLOAD_{key.upper()}"
+            if self.config.has_option('TIMEOUTS', option):
+                download[key] = self.config.getfloat('TIMEOUTS', option)
+        return {"defaults": defaults, "download": download}
+
+    def get_batch_config(self):
+        """读取批量生成相关配置"""
+        return {
+            "qwen_max_batch": self.config.getint('BATCH', 'QWEN_MAX_BATCH', fallback=8),
+        }
+
+    def get_jobs_config(self):
+        """读取异步任务（提交-轮询）配置"""
+        return {
+            "enabled": self.config.getboolean('JOBS', 'ENABLED', fallback=False),
+            "status_url": self.config.get('JOBS', 'STATUS_URL', fallback=''),
+            "poll_interval": self.config.getfloat('JOBS', 'POLL_INTERVAL', fallback=2.0),
+            "max_poll_interval": self.config.getfloat('JOBS', 'MAX_POLL_INTERVAL', fallback=15.0),
+        }
+
+    def get_cache_dir(self):
+        """本地缓存目录，默认为插件目录下的 cache"""
+        cache_dir = self.config.get('CACHE', 'DIR', fallback='').strip()
+        if not cache_dir:
+            current_dir = os.path.dirname(os.path.abspath(__file__))
+            cache_dir = os.path.join(os.path.dirname(current_dir), 'cache')
+        return cache_dir
+
+    def get_journal_config(self):
+        """读取任务日志配置"""
+        return {
+            "enabled": self.config.getboolean('JOURNAL', 'ENABLED', fallback=True),
+            "result_ttl": self.config.getfloat('JOURNAL', 'RESULT_TTL_HOURS', fallback=24) * 3600,
+        }
+
+    def get_video_cache_config(self):
+        """读取视频缓存配置"""
+        return {
+            "max_bytes": self.config.getint('VIDEO_CACHE', 'MAX_SIZE_MB', fallback=2048) * 1024 * 1024,
+            "max_age": self.config.getfloat('VIDEO_CACHE', 'MAX_AGE_HOURS', fallback=72) * 3600,
+        }
+
+    def get_result_cache_config(self):
+        """读取结果图片缓存配置"""
+        return {
+            "enabled": self.config.getboolean('RESULT_CACHE', 'ENABLED', fallback=True),
+            "max_bytes": self.config.getint('RESULT_CACHE', 'MAX_SIZE_MB', fallback=1024) * 1024 * 1024,
+        }
+
+    def get_encode_cache_config(self):
+        """读取输入图片编码缓存配置"""
+        return {
+            "enabled": self.config.getboolean('ENCODE_CACHE', 'ENABLED', fallback=True),
+            "max_bytes": self.config.getint('ENCODE_CACHE', 'MAX_SIZE_MB', fallback=256) * 1024 * 1024,
+        }
+
+    def get_memo_config(self):
+        """读取记忆化配置，NODES 为逗号分隔的节点类名，* 表示全部节点"""
+        nodes = self.config.get('MEMO', 'NODES', fallback='')
+        return {
+            "nodes": [name.strip() for name in nodes.split(',') if name.strip()],
+            "max_entries": self.config.getint('MEMO', 'MAX_ENTRIES', fallback=32),
+        }
+
+    def get_upload_encoding_config(self):
+        """
+        读取上传编码策略
+        [UPLOAD_ENCODING] 为全部模型的默认策略，[UPLOAD_ENCODING:模型名] 覆盖单个模型
+        :return: ({"default"/模型名: 策略字典}, 上传带宽配置)
+        """
+        policies = {}
+        for section in self.config.sections():
+            if section == 'UPLOAD_ENCODING':
+                model = "default"
+            elif section.startswith('UPLOAD_ENCODING:'):
+                model = section.split(':', 1)[1].strip()
+            else:
+                continue
+            items = self.config[section]
+            policy = {}
+            if items.get('FORMAT', '').strip():
+                policy["format"] = items.get('FORMAT').strip().lower()
+            if items.get('SUBSAMPLING', '').strip():
+                policy["subsampling"] = items.get('SUBSAMPLING').strip()
+            if items.get('MASK_FORMAT', '').strip():
+                policy["mask_format"] = items.get('MASK_FORMAT').strip().lower()
+            for key, name in (('QUALITY', 'quality'), ('MIN_QUALITY', 'min_quality'), ('TARGET_KB', 'target_bytes')):
+                if items.get(key, '').strip():
+                    policy[name] = items.getint(key) * (1024 if key == 'TARGET_KB' else 1)
+            for key, name in (('LOSSLESS', 'lossless'), ('WEBP_FALLBACK', 'webp_fallback')):
+                if items.get(key, '').strip():
+                    policy[name] = items.getboolean(key)
+            policies[model] = policy
+        upload = {
+            "upload_kbps": self.config.getint('UPLOAD_ENCODING', 'UPLOAD_KBPS', fallback=0),
+            "upload_seconds": self.config.getfloat('UPLOAD_ENCODING', 'UPLOAD_SECONDS', fallback=0),
+        }
+        return policies, upload
+
     def set_api_key(self, key):
         """设置新的API KEY并保存到配置文件"""
         if not self.config.has_section('API'):
@@ -21,5 +191,5 @@ class ConfigManager:
         
         current_dir = os.path.dirname(os.path.abspath(__file__))
         config_path = os.path.join(os.path.dirname(current_dir), 'config.ini')
-        with open(config_path, 'w') as configfile:
+        with open(config_path, 'w', encoding='utf-8') as configfile:
             self.config.write(configfile)
\ No newline at end of file
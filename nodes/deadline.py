@@ -0,0 +1,202 @@
+import re
+import time
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+import requests
+
+from .config import ConfigManager
+
+# 各模型请求的超时预算（秒），按 payload 中的 resolution（或 size 的 "2K:" 前缀）细分
+#   connect: 建立连接的超时，后端或 CDN 不可达时几秒内失败
+#   read:    等待响应数据的超时（两次收到数据之间的最长间隔）
+#   total:   一次请求的总预算，提交、重试、轮询和下载结果共用（parallel_map 的每一项各自计时）
+# 表中的 read 只会收紧调用处传入的 timeout，不会放宽：按分辨率放宽的档位（如 4K）要生效，
+# 调用处须传入不小于该档位的 timeout（见 nano-banana-pro、vidu_video 节点）；未列出的模型 read 取调用处的 timeout，
+# total 缺省为 read 加上下载预算；config.ini 的 [TIMEOUTS] 可覆盖默认值
+MODEL_DEADLINES = {
+    "default": {"connect": 10},
+    # 同步接口，1 分钟内返回
+    "qwen-image-edit": {"read": 60, "total": 180},
+    # 4K 组图生成明显更慢
+    "doubao-seedream-4.5": {
+        "read": 900, "total": 1200,
+        "resolutions": {"4K": {"read": 1200, "total": 1500}},
+    },
+    "nano-banana-pro": {
+        "read": 300, "total": 420,
+        "resolutions": {"4K": {"read": 600, "total": 720}},
+    },
+    "vidu_video": {
+        "read": 240, "total": 360,
+        "resolutions": {"1080P": {"read": 400, "total": 600}},
+    },
+}
+
+# 下载结果图片/视频的默认超时
+DOWNLOAD_DEADLINE = {"connect": 5, "read": 30, "total": 120}
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """节点执行的总时间预算已用完"""
+
+
+class Deadline:
+    """一次请求的截止时间，提交、重试、轮询和下载共用同一个预算"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return self.expires_at - time.monotonic()
+
+    def extend(self, seconds):
+        """顺延截止时间（在本地排队等待的时间不计入预算）"""
+        if seconds > 0:
+            self.expires_at += seconds
+
+    def check(self, what=""):
+        """预算已用完时抛出 DeadlineExceeded"""
+        if self.remaining() <= 0:
+            raise DeadlineExceeded(f"{what} 超出 {self.seconds:.0f} 秒的总时间预算".strip())
+
+    def timeout(self, connect, read):
+        """按剩余预算收紧 (connect, read) 超时，预算已用完时抛出 DeadlineExceeded"""
+        self.check()
+        remaining = self.remaining()
+        return min(connect, remaining), min(read, remaining)
+
+
+# 当前的预算范围：{"deadline": 本范围的截止时间, "parent": 外层范围的截止时间}
+_current = contextvars.ContextVar("mjapi_deadline", default=None)
+
+
+def current_deadline():
+    """当前范围的截止时间；本范围尚未发出请求时沿用外层的截止时间，都没有时返回 None"""
+    scope = _current.get()
+    if scope is None:
+        return None
+    return scope["deadline"] if scope["deadline"] is not None else scope["parent"]
+
+
+@contextmanager
+def deadline_scope():
+    """
+    开启一个预算范围：范围内第一次 API 请求按其模型的 total 设定截止时间，之后的请求、重试和下载共用
+    节点的每次执行、parallel_map 的每一项各开一个范围，批量处理时每项有独立的预算，不会互相挤占；
+    范围内还没有发出请求时（如只下载上一步返回的结果）沿用外层的截止时间
+    """
+    token = _current.set({"deadline": None, "parent": current_deadline()})
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def resolution_of(payload):
+    """从 payload 中取分辨率档位（1K/2K/4K/720P/1080P 等），取不到时返回 None"""
+    if not isinstance(payload, dict):
+        return None
+    value = payload.get("resolution") or payload.get("size")
+    if not isinstance(value, str):
+        return None
+    match = re.match(r"^\s*(\d+[kKpP])\b", value)
+    return match.group(1).upper() if match else None
+
+
+class DeadlinePolicy:
+    """按模型和分辨率查找超时预算"""
+
+    def __init__(self, table=None, defaults=None, download=None):
+        """
+        :param table: 模型超时表，默认 MODEL_DEADLINES
+        :param defaults: 覆盖 "default" 的配置（来自 config.ini）
+        :param download: 覆盖下载超时的配置
+        """
+        self.table = table or MODEL_DEADLINES
+        self.defaults = defaults or {}
+        self.download = dict(DOWNLOAD_DEADLINE, **(download or {}))
+
+    @classmethod
+    def from_config(cls, config_manager=None):
+        config_manager = config_manager or ConfigManager()
+        return cls(**config_manager.get_timeout_config())
+
+    def resolve(self, model, payload=None, timeout=None):
+        """
+        :param model: payload 中的 model 名称
+        :param payload: 请求 payload，用于读取分辨率
+        :param timeout: 调用处原有的超时（秒），表中的 read 只会收紧它
+        :return: {"connect", "read", "total"}
+        """
+        policy = {"connect": 10, "read": None, "total": None}
+        policy.update({k: v for k, v in self.table["default"].items() if k != "resolutions"})
+        policy.update(self.defaults)
+        entry = self.table.get(model, {})
+        policy.update({k: v for k, v in entry.items() if k != "resolutions"})
+        resolution = resolution_of(payload)
+        if resolution:
+            policy.update(entry.get("resolutions", {}).get(resolution, {}))
+        if timeout is not None:
+            policy["read"] = timeout if policy["read"] is None else min(policy["read"], timeout)
+        if policy["read"] is None:
+            policy["read"] = policy["total"] or 300
+        if policy["total"] is None:
+            # 调用处的 timeout 只覆盖等待生成结果，另外留出下载结果的时间
+            policy["total"] = policy["read"] + self.download["total"]
+        return policy
+
+    def begin(self, model, payload=None, timeout=None):
+        """
+        在当前范围中设定总截止时间（已设定时沿用），之后的请求、重试、轮询和下载共用
+        :return: (policy, Deadline)
+        """
+        policy = self.resolve(model, payload, timeout)
+        scope = _current.get()
+        if scope is None:
+            return policy, Deadline(policy["total"])
+        if scope["deadline"] is None:
+            scope["deadline"] = Deadline(policy["total"])
+        return policy, scope["deadline"]
+
+    def request_timeout(self, model, payload=None, timeout=None):
+        """
+        API 请求的 (connect, read) 超时（未按剩余预算收紧）和截止时间
+        :return: ((connect, read), Deadline)
+        """
+        if isinstance(timeout, tuple):
+            # 调用处已显式区分连接/读取超时
+            return timeout, current_deadline() or Deadline(sum(timeout))
+        policy, deadline = self.begin(model, payload, timeout)
+        return (policy["connect"], policy["read"]), deadline
+
+    def download_timeout(self):
+        """
+        下载的 (connect, read) 超时（未按剩余预算收紧）和截止时间：
+        节点执行中与提交请求共用剩余预算（且不超过下载预算），否则单独计算
+        """
+        deadline = current_deadline()
+        if deadline is None or deadline.remaining() > self.download["total"]:
+            deadline = Deadline(min(self.download["total"], deadline.remaining()) if deadline else self.download["total"])
+        return (self.download["connect"], self.download["read"]), deadline
+
+    def wrap(self, node_class):
+        """为节点类的 FUNCTION 方法开启独立的预算范围"""
+        func_name = getattr(node_class, "FUNCTION", None)
+        func = getattr(node_class, func_name, None) if func_name else None
+        if func is None:
+            return node_class
+
+        @wraps(func)
+        def scoped(self, *args, **kwargs):
+            with deadline_scope():
+                return func(self, *args, **kwargs)
+
+        setattr(node_class, func_name, scoped)
+        return node_class
+
+
+# 所有节点共享的超时策略
+deadline_policy = DeadlinePolicy.from_config()
@@ -0,0 +1,163 @@
+import time
+import logging
+
+import requests
+
+from .client import http_client
+from .config import ConfigManager
+from .deadline import current_deadline, deadline_policy
+from .journal import JobJournal, job_journal
+
+
+class JobClient:
+    """
+    长耗时任务（视频生成等）的提交-轮询客户端
+    开启后节点只提交任务并拿到 job_id，随后按退避间隔轮询任务状态，
+    不再让一个 HTTP 连接挂起数分钟；轮询时的网络中断只会重试，不会丢失已付费的任务。
+    未开启或后端直接返回结果时，行为与原来的同步请求一致。
+    """
+
+    SUCCEEDED = ("succeeded", "success", "completed", "done")
+    FAILED = ("failed", "error", "cancelled", "canceled")
+
+    def __init__(self, enabled=False, status_url="", poll_interval=2.0, max_poll_interval=15.0,
+                 backoff=1.5, submit_timeout=60, journal=None, group=None):
+        """
+        :param enabled: 是否启用异步任务模式
+        :param status_url: 任务状态地址模板，包含 {job_id}；启用异步模式时必须配置，为空时仍按同步方式请求
+        :param poll_interval: 首次轮询间隔（秒）
+        :param max_poll_interval: 轮询间隔上限（秒）
+        :param backoff: 每次轮询后间隔的放大倍数
+        :param submit_timeout: 提交任务的超时时间（秒）
+        :param journal: 任务日志（JobJournal），用于重启后恢复任务；为 None 时不记录
+        :param group: 提交请求所属的并发限制组（如 "video"），模型本身未配置并发上限时使用
+        """
+        if enabled and not status_url:
+            logging.warning("[JobClient] 已启用异步任务模式但未配置 [JOBS] STATUS_URL，按同步方式请求")
+            enabled = False
+        self.enabled = enabled
+        self.status_url = status_url
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.backoff = backoff
+        self.submit_timeout = submit_timeout
+        self.journal = journal
+        self.group = group
+
+    @classmethod
+    def from_config(cls, config_manager=None, journal=None, group=None):
+        config_manager = config_manager or ConfigManager()
+        return cls(journal=journal, group=group, **config_manager.get_jobs_config())
+
+    def status_url_for(self, job_id):
+        return self.status_url.format(job_id=job_id)
+
+    def run(self, api_url, headers, payload, timeout):
+        """
+        执行一次任务并返回结果 JSON（结构与同步接口的响应一致）
+
+        :param timeout: 整个任务允许的最长时间（秒），超时表中配置了该模型时以表为准
+        """
+        # 以节点的任务时长设定本次执行的截止时间，提交、轮询和之后的结果下载共用
+        deadline_policy.begin(payload.get("model"), payload, timeout)
+        key = self.journal.payload_hash(payload) if self.journal else None
+        entry = self.journal.lookup(key) if self.journal else None
+        if entry and entry["status"] == JobJournal.SUCCEEDED and entry["result"] and entry["updated"] < self.journal.started:
+            # 重启前已完成、可能还没来得及交付的任务，复用一次结果；本进程内再次执行时照常提交新任务
+            logging.info(f"[JobClient] 重启前相同输入的任务已完成，直接复用结果: {payload.get('model')}")
+            self._record(key, JobJournal.SUCCEEDED)
+            return entry["result"]
+
+        if entry and entry["status"] == JobJournal.PENDING and entry["job_id"] and self.status_url:
+            # 上次提交的任务还未取回结果（如 ComfyUI 重启），继续轮询而不是重新提交
+            logging.info(f"[JobClient] 恢复未完成的任务: {entry['job_id']}")
+            return self._wait_and_record(key, api_url, headers, entry["job_id"], timeout)
+
+        if not self.enabled:
+            response = http_client.post(api_url, headers=headers, json=payload, timeout=timeout, group=self.group)
+            response.raise_for_status()
+            result = response.json()
+            self._record(key, JobJournal.SUCCEEDED, payload, result=result)
+            return result
+
+        job_id, result = self.submit(api_url, headers, payload)
+        if job_id is None:
+            # 后端不支持异步任务时会直接返回结果
+            self._record(key, JobJournal.SUCCEEDED, payload, result=result)
+            return result
+        self._record(key, JobJournal.PENDING, payload, job_id=job_id)
+        return self._wait_and_record(key, api_url, headers, job_id, timeout)
+
+    def _record(self, key, status, payload=None, job_id=None, result=None):
+        if self.journal is None:
+            return
+        model = payload.get("model") if payload else None
+        self.journal.record(key, status, model=model, job_id=job_id, result=result)
+
+    def _wait_and_record(self, key, api_url, headers, job_id, timeout):
+        try:
+            result = self.wait(api_url, headers, job_id, timeout)
+        except RuntimeError:
+            self._record(key, JobJournal.FAILED)
+            raise
+        # 超时等异常保留 pending 状态，下次执行时继续轮询
+        self._record(key, JobJournal.SUCCEEDED, result=result)
+        return result
+
+    def submit(self, api_url, headers, payload):
+        """提交任务，返回 (job_id, None)；后端直接返回结果时返回 (None, result)"""
+        body = dict(payload)
+        body["async"] = True
+        response = http_client.post(api_url, headers=headers, json=body, timeout=self.submit_timeout,
+                                    group=self.group)
+        response.raise_for_status()
+        result = response.json()
+        job_id = result.get("job_id") or result.get("task_id")
+        if not job_id:
+            return None, result
+        logging.info(f"[JobClient] 任务已提交: {job_id}")
+        return job_id, None
+
+    def status(self, api_url, headers, job_id):
+        """查询一次任务状态，返回状态 JSON；网络异常或服务端暂时不可用时返回 None，其他 4xx 抛出 RuntimeError"""
+        try:
+            # 轮询本身按退避间隔重试，单次查询不再重试
+            response = http_client.get(self.status_url_for(job_id), headers=headers,
+                                       timeout=self.submit_timeout, retry=False)
+        except requests.exceptions.RequestException as e:
+            logging.warning(f"[JobClient] 查询任务 {job_id} 失败，稍后重试: {e}")
+            return None
+        if response.status_code in (408, 429) or response.status_code >= 500:
+            logging.warning(f"[JobClient] 查询任务 {job_id} 返回 {response.status_code}，稍后重试")
+            return None
+        if response.status_code >= 400:
+            # 任务不存在或已过期（404/410 等），继续轮询没有意义；按失败处理，下次执行重新提交
+            raise RuntimeError(f"任务 {job_id} 查询失败（状态码 {response.status_code}），可能已过期")
+        return response.json()
+
+    def wait(self, api_url, headers, job_id, timeout):
+        """按退避间隔轮询直到任务完成，返回任务结果"""
+        deadline = time.monotonic() + timeout
+        shared = current_deadline()
+        if shared is not None:
+            # 不超过节点执行的剩余预算
+            deadline = min(deadline, time.monotonic() + shared.remaining())
+        interval = self.poll_interval
+        while True:
+            data = self.status(api_url, headers, job_id)
+            if data:
+                status = str(data.get("status", "")).lower()
+                if status in self.SUCCEEDED:
+                    return data.get("result") or data
+                if status in self.FAILED:
+                    raise RuntimeError(f"任务 {job_id} 失败: {data.get('error') or status}")
+            if time.monotonic() + interval > deadline:
+                raise TimeoutError(f"任务 {job_id} 在 {timeout} 秒内未完成")
+            time.sleep(interval)
+            interval = min(interval * self.backoff, self.max_poll_interval)
+
+
+# 视频节点共享的任务客户端
+video_jobs = JobClient.from_config(journal=job_journal, group="video")
+# 同步生成的图片节点，只使用任务日志恢复结果
+image_jobs = JobClient(journal=job_journal)
@@ -0,0 +1,113 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+from .config import ConfigManager
+
+
+class JobJournal:
+    """
+    持久化的任务日志（SQLite）
+    记录每次提交的 payload 哈希、job_id / 结果和状态。ComfyUI 重启后以相同输入重新执行节点时，
+    已完成的任务直接复用结果，进行中的任务继续轮询，不再重复提交和重复计费。
+    """
+
+    PENDING = "pending"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+    def __init__(self, path, enabled=True, result_ttl=24 * 3600):
+        """
+        :param path: SQLite 文件路径
+        :param enabled: 是否启用
+        :param result_ttl: 已完成结果的有效期（秒），超过后视为过期（结果地址可能已失效）
+        """
+        self.path = path
+        self.enabled = enabled
+        self.result_ttl = result_ttl
+        # 本进程的启动时间，早于它的记录来自上一次运行（重启前）
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._conn = None
+
+    @classmethod
+    def from_config(cls, config_manager=None):
+        config_manager = config_manager or ConfigManager()
+        journal_config = config_manager.get_journal_config()
+        path = os.path.join(config_manager.get_cache_dir(), "jobs.sqlite3")
+        return cls(path, **journal_config)
+
+    @staticmethod
+    def payload_hash(payload):
+        """payload 的规范化哈希，键顺序不影响结果"""
+        data = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "key TEXT PRIMARY KEY, model TEXT, status TEXT, job_id TEXT, result TEXT, "
+                "created REAL, updated REAL)"
+            )
+            # 清理过期记录，避免文件无限增长
+            self._conn.execute("DELETE FROM jobs WHERE updated < ?", (time.time() - max(self.result_ttl, 7 * 24 * 3600),))
+            self._conn.commit()
+        return self._conn
+
+    def lookup(self, key):
+        """返回 key 对应的记录（dict），不存在、已失败或结果已过期时返回 None"""
+        if not self.enabled:
+            return None
+        try:
+            with self._lock:
+                row = self._connect().execute(
+                    "SELECT status, job_id, result, updated FROM jobs WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logging.warning(f"[JobJournal] 读取任务日志失败: {e}")
+            return None
+        if row is None:
+            return None
+        status, job_id, result, updated = row
+        if status == self.FAILED:
+            return None
+        if status == self.SUCCEEDED and time.time() - updated > self.result_ttl:
+            return None
+        return {
+            "status": status,
+            "job_id": job_id,
+            "result": json.loads(result) if result else None,
+            "updated": updated,
+        }
+
+    def record(self, key, status, model=None, job_id=None, result=None):
+        """写入或更新一条记录"""
+        if not self.enabled:
+            return
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT INTO jobs (key, model, status, job_id, result, created, updated) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET status = excluded.status, "
+                    "job_id = COALESCE(excluded.job_id, jobs.job_id), "
+                    "result = COALESCE(excluded.result, jobs.result), "
+                    "model = COALESCE(excluded.model, jobs.model), updated = excluded.updated",
+                    (key, model, status, job_id, json.dumps(result, ensure_ascii=False) if result is not None else None, now, now),
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            logging.warning(f"[JobJournal] 写入任务日志失败: {e}")
+
+
+# 进程级共享实例
+job_journal = JobJournal.from_config()
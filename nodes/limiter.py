@@ -0,0 +1,273 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+from .config import ConfigManager
+
+
+class TokenBucket:
+    """
+    进程级令牌桶限速：平均每秒 rate 个请求，允许 burst 个突发
+    rate <= 0 时不限速
+    """
+
+    def __init__(self, rate=0.0, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取一个令牌，不足时等待；返回等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class ModelLimit:
+    """
+    单个模型（或模型组）的并发上限，可在运行中调整 limit
+    adaptive 时按 AIMD 自动调整：名额用满时每完成 limit 个请求加 1，
+    遇到 429/503、超时（以及开启 spike_factor 时的延迟突增）时减半（约一个请求往返的冷却期内只减一次，避免同一批请求的多个 429 把上限压到底）
+    """
+
+    # 视为后端过载的状态码
+    OVERLOAD_STATUS = (429, 503)
+
+    def __init__(self, limit, adaptive=False, min_limit=1, max_limit=None, spike_factor=0.0):
+        """
+        :param limit: 初始并发上限
+        :param adaptive: 是否按 AIMD 自动调整
+        :param min_limit: 自动调整的下限
+        :param max_limit: 自动调整的上限，None 时不超过初始值的 8 倍
+        :param spike_factor: 延迟超过平滑延迟的多少倍视为突增，<=0 时不按延迟判断
+                             （生成耗时随分辨率、尺寸成倍变化，只适合请求规格固定的模型）
+        """
+        self.limit = limit
+        self.adaptive = adaptive
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max_limit or limit * 8
+        self.spike_factor = spike_factor
+        self.latency = None
+        self.samples = 0
+        self.increases = 0
+        self.decreases = 0
+        self._credit = 0.0
+        self._last_decrease = 0.0
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.requests = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """占用一个并发名额，返回排队等待的秒数"""
+        start = time.monotonic()
+        with self._condition:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+            try:
+                while self.in_flight >= self.limit:
+                    self._condition.wait()
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+        return time.monotonic() - start
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def set_limit(self, limit):
+        with self._condition:
+            self.limit = max(1, limit)
+            self._condition.notify_all()
+
+    def observe(self, latency, status_code=None, timed_out=False):
+        """
+        记录一次请求的结果，adaptive 时据此调整上限
+        :param latency: 请求耗时（秒，不含排队）
+        :param status_code: 响应状态码，请求异常时为 None
+        :param timed_out: 请求是否超时
+        """
+        if not self.adaptive:
+            return
+        with self._condition:
+            overloaded = timed_out or status_code in self.OVERLOAD_STATUS
+            if not overloaded and status_code is not None and status_code < 400:
+                # 至少积累几个样本后才判断延迟突增
+                spike = self.spike_factor > 0 and self.samples >= 5 and latency > self.latency * self.spike_factor
+                self.latency = latency if self.latency is None else self.latency * 0.9 + latency * 0.1
+                self.samples += 1
+                overloaded = spike
+                # 刚减半后的一个冷却期内不增长，等待在途请求反映新的上限
+                saturated = self.waiting > 0 or self.in_flight >= self.limit
+                recovering = time.monotonic() - self._last_decrease < self._cooldown()
+                if not spike and saturated and not recovering and self.limit < self.max_limit:
+                    # 加性增长：每个"窗口"（limit 个成功请求）加 1
+                    self._credit += 1.0 / self.limit
+                    if self._credit >= 1.0:
+                        self._credit = 0.0
+                        self.limit += 1
+                        self.increases += 1
+                        self._condition.notify()
+            if overloaded:
+                now = time.monotonic()
+                # 冷却期内同一批在途请求的过载信号只减一次
+                if now - self._last_decrease >= self._cooldown():
+                    self._last_decrease = now
+                    self._credit = 0.0
+                    new_limit = max(self.min_limit, self.limit // 2)
+                    if new_limit < self.limit:
+                        logging.warning(f"[RequestGovernor] 后端过载，并发上限 {self.limit} -> {new_limit}")
+                        self.limit = new_limit
+                        self.decreases += 1
+
+    def _cooldown(self):
+        """冷却期：约一个请求往返（平滑延迟），至少 0.1 秒"""
+        return max(0.1, self.latency or 1.0)
+
+    def record_wait(self, waited):
+        with self._condition:
+            self.requests += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+
+    def stats(self):
+        with self._condition:
+            return {
+                "limit": self.limit,
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "max_waiting": self.max_waiting,
+                "requests": self.requests,
+                "avg_wait": round(self.total_wait / self.requests, 3) if self.requests else 0.0,
+                "max_wait": round(self.max_wait, 3),
+                "adaptive": self.adaptive,
+                "latency": round(self.latency, 3) if self.latency is not None else None,
+                "increases": self.increases,
+                "decreases": self.decreases,
+            }
+
+
+class RequestGovernor:
+    """
+    所有 API 节点共享的请求调度：全局令牌桶限速 + 按模型的并发上限
+    进程内所有节点类、同时执行的多个 prompt 都经过同一个实例，
+    避免一个工作流同时向 oneapi_url 发出几十个请求后收到一片 429
+    """
+
+    def __init__(self, rate=0.0, burst=1, limits=None, default_limit=0, adaptive=False, min_limit=1,
+                 max_limit=32, spike_factor=0.0):
+        """
+        :param rate: 全局每秒请求数，<=0 不限速
+        :param burst: 令牌桶容量（允许的突发请求数）
+        :param limits: {模型名或组名: 最大并发数}，如 {"nano-banana-pro": 4, "video": 2}；adaptive 时为初始值
+        :param default_limit: 未单独配置的模型的并发上限，<=0 不限制（adaptive 时从 max_limit 开始）
+        :param adaptive: 是否按 429/503 和延迟自动调整各模型的并发上限（AIMD）
+        :param min_limit: 自动调整的下限
+        :param max_limit: 自动调整的上限
+        :param spike_factor: 延迟超过平滑延迟的多少倍视为过载，<=0 时只按 429/503 和超时判断
+        """
+        self.bucket = TokenBucket(rate, burst)
+        self.default_limit = default_limit
+        self.adaptive = adaptive
+        self._limit_options = {
+            "adaptive": adaptive,
+            "min_limit": min_limit,
+            "max_limit": max_limit,
+            "spike_factor": spike_factor,
+        }
+        self._limits = {
+            name: self._new_limit(limit) for name, limit in (limits or {}).items() if limit > 0
+        }
+        self._lock = threading.Lock()
+        self.rate_wait = 0.0
+
+    @classmethod
+    def from_config(cls, config_manager=None):
+        config_manager = config_manager or ConfigManager()
+        return cls(**config_manager.get_limiter_config())
+
+    def _new_limit(self, limit):
+        options = dict(self._limit_options)
+        options["max_limit"] = max(limit, options["max_limit"])
+        return ModelLimit(limit, **options)
+
+    def limit_for(self, model, group=None):
+        """按 模型名 → 组名 → 默认上限 的顺序找到对应的并发限制，不限制时返回 (None, None)"""
+        for key in (model, group):
+            if key and key in self._limits:
+                return key, self._limits[key]
+        if model and (self.default_limit > 0 or self.adaptive):
+            with self._lock:
+                if model not in self._limits:
+                    initial = self.default_limit if self.default_limit > 0 else self._limit_options["max_limit"]
+                    self._limits[model] = self._new_limit(initial)
+                return model, self._limits[model]
+        return None, None
+
+    @contextmanager
+    def slot(self, model=None, group=None):
+        """
+        占用一次请求的并发名额和令牌，退出时释放
+        调用方把响应状态码写入 yield 出的 outcome["status"]，用于自动调整并发上限；outcome["waited"] 为排队等待的秒数
+
+        :param model: payload 中的 model 名称
+        :param group: 模型组名（如视频节点的 "video"），模型本身未配置时使用
+        """
+        key, limit = self.limit_for(model, group)
+        waited = limit.acquire() if limit else 0.0
+        try:
+            rate_waited = self.bucket.acquire()
+            if rate_waited:
+                with self._lock:
+                    self.rate_wait += rate_waited
+            waited += rate_waited
+            if limit:
+                limit.record_wait(waited)
+            if waited > 1:
+                logging.info(f"[RequestGovernor] {key or model} 排队 {waited:.1f} 秒")
+            outcome = {"status": None, "timed_out": False, "waited": waited}
+            start = time.monotonic()
+            try:
+                yield outcome
+            finally:
+                if limit:
+                    limit.observe(time.monotonic() - start, outcome["status"], outcome["timed_out"])
+        finally:
+            if limit:
+                limit.release()
+
+    def stats(self):
+        """各模型的并发上限、在途请求数、排队数和等待时间"""
+        with self._lock:
+            limits = dict(self._limits)
+            rate_wait = round(self.rate_wait, 3)
+        return {
+            "adaptive": self.adaptive,
+            "rate": self.bucket.rate,
+            "burst": self.bucket.burst,
+            "rate_wait": rate_wait,
+            "models": {name: limit.stats() for name, limit in limits.items()},
+        }
+
+
+# 进程级共享实例，所有节点的 API 请求都经过它
+request_governor = RequestGovernor.from_config()
@@ -0,0 +1,152 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+import numpy as np
+import torch
+
+from .base import ImageConverter
+from .config import ConfigManager
+
+
+class Memoizer:
+    """
+    确定性请求记忆化
+    对节点的全部输入（模型/提示词/种子/参数以及输入图片 tensor 的内容）计算哈希，
+    相同输入再次执行时直接返回上次的输出，不再请求付费接口；
+    同时为节点提供 IS_CHANGED，让 ComfyUI 自身的执行缓存也能跳过该节点。
+    只对 config.ini 中 [MEMO] NODES 列出的节点生效，非确定性的模型不要加入。
+    """
+
+    def __init__(self, nodes=(), max_entries=32):
+        """
+        :param nodes: 启用记忆化的节点类名集合，包含 "*" 时对全部节点启用
+        :param max_entries: 内存中最多保留的输出条数（LRU）
+        """
+        self.nodes = set(nodes)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_config(cls, config_manager=None):
+        config_manager = config_manager or ConfigManager()
+        return cls(**config_manager.get_memo_config())
+
+    def enabled_for(self, node_name):
+        return "*" in self.nodes or node_name in self.nodes
+
+    @staticmethod
+    def _update(digest, value):
+        """将一个输入值按类型写入哈希"""
+        if isinstance(value, torch.Tensor):
+            data = value.detach().cpu().contiguous()
+            digest.update(f"tensor:{data.dtype}:{tuple(data.shape)}:".encode())
+            if data.dtype == torch.bfloat16:
+                data = data.float()
+            digest.update(data.numpy().tobytes())
+        elif isinstance(value, np.ndarray):
+            digest.update(f"ndarray:{value.dtype}:{value.shape}:".encode())
+            digest.update(np.ascontiguousarray(value).tobytes())
+        elif isinstance(value, dict):
+            digest.update(b"dict{")
+            for key in sorted(value, key=str):
+                Memoizer._update(digest, str(key))
+                Memoizer._update(digest, value[key])
+            digest.update(b"}")
+        elif isinstance(value, (list, tuple)):
+            digest.update(b"list[")
+            for item in value:
+                Memoizer._update(digest, item)
+            digest.update(b"]")
+        else:
+            digest.update(f"{type(value).__name__}:{value!r};".encode("utf-8", "surrogatepass"))
+
+    @staticmethod
+    def input_hash(node_name, kwargs):
+        """计算节点名 + 全部输入的哈希"""
+        digest = hashlib.sha256(node_name.encode("utf-8"))
+        Memoizer._update(digest, kwargs)
+        return digest.hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            output = self._entries.get(key)
+            if output is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return output
+
+    def contains(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def is_changed(self, node_name, kwargs):
+        """
+        IS_CHANGED 的返回值：已缓存成功结果时为输入哈希（输入不变则 ComfyUI 跳过该节点）；
+        未缓存（首次执行、上次出错或已被淘汰）时返回 NaN，NaN 与任何值都不相等，ComfyUI 总会重新执行
+        """
+        key = Memoizer.input_hash(node_name, kwargs)
+        return key if self.contains(key) else float("nan")
+
+    def put(self, key, output):
+        with self._lock:
+            self._entries[key] = output
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def wrap(self, node_name, node_class):
+        """
+        为节点类安装记忆化：包装 FUNCTION 指向的方法，并补充 IS_CHANGED
+        未在配置中启用的节点保持原样
+        """
+        if not self.enabled_for(node_name):
+            return node_class
+        func_name = getattr(node_class, "FUNCTION", None)
+        func = getattr(node_class, func_name, None) if func_name else None
+        if func is None:
+            return node_class
+        memoizer = self
+
+        @wraps(func)
+        def memoized(self, *args, **kwargs):
+            if args:
+                # ComfyUI 总是以关键字参数调用，位置参数调用时不做记忆化
+                return func(self, *args, **kwargs)
+            key = Memoizer.input_hash(node_name, kwargs)
+            output = memoizer.get(key)
+            if output is not None:
+                logging.info(f"[Memo] {node_name} 输入未变化，直接复用上次结果")
+                return output
+            with ImageConverter.track_errors() as errors:
+                output = func(self, **kwargs)
+            # 本次执行出错（生成了错误图片，或节点以文字返回了错误）的结果不缓存，下次仍会重新请求
+            if not errors["count"]:
+                memoizer.put(key, output)
+            return output
+
+        setattr(node_class, func_name, memoized)
+        if "IS_CHANGED" not in node_class.__dict__:
+            node_class.IS_CHANGED = classmethod(lambda cls, **kwargs: memoizer.is_changed(node_name, kwargs))
+        return node_class
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "nodes": sorted(self.nodes),
+            }
+
+
+# 进程级共享实例
+memoizer = Memoizer.from_config()
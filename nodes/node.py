@@ -8,11 +8,17 @@ import torch
 import os
 from comfy_api.input_impl.video_types import VideoFromFile
 
-from .base import ImageConverter
+from .base import ImageConverter, ImageHandle
+from .client import http_client
 from .config import ConfigManager
+from .jobs import image_jobs, video_jobs
+from .deadline import deadline_policy
+from .memo import memoizer
+from .parallel import parallel_map
 import random
 # 初始化配置管理器
 config_manager = ConfigManager()
+qwen_max_batch = config_manager.get_batch_config()["qwen_max_batch"]
 
 
 class ReplaceNode:
@@ -41,9 +47,6 @@ class ReplaceNode:
         # 调用配置管理器获取配置
         oneapi_url, oneapi_token = config_manager.get_api_config()
 
-        pro_base64 = ImageConverter.merge_image(Product_image, Product_mask)
-        mig_base64 = ImageConverter.merge_image(migrate_image, migrate_mask)
-
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {oneapi_token}"
@@ -57,12 +60,13 @@ class ReplaceNode:
             "prompt": prompt,
             "strong": strong,
             "seed": seed, 
-            "image": pro_base64,
-            "imagem": mig_base64
         }
+        # 图像和遮罩单遍编码，传输格式由模型的 mask_format 决定
+        payload.update(ImageConverter.encode_masked_image(Product_image, Product_mask, "image", model="Product_migrate_mjAPI"))
+        payload.update(ImageConverter.encode_masked_image(migrate_image, migrate_mask, "imagem", model="Product_migrate_mjAPI"))
 
         try:
-            response = requests.post(oneapi_url, headers=headers, json=payload, timeout=300)
+            response = http_client.post(oneapi_url, headers=headers, json=payload, timeout=300)
             # 判断状态码是否为 200
             if response.status_code != 200:
                 error_msg = ImageConverter.get_status_error_msg(response)
@@ -76,7 +80,7 @@ class ReplaceNode:
             if not result_url:
                 raise ValueError("API返回空图像数据.")
 
-            responseurl = requests.get(result_url)
+            responseurl = http_client.get(result_url)
             if responseurl.status_code != 200:
                 raise ValueError("从 URL 获取图片失败。")
             
@@ -117,8 +121,6 @@ class KouTuNode:
         # 调用配置管理器获取配置
         oneapi_url, oneapi_token = config_manager.get_api_config()
 
-        mig_base64 = ImageConverter.merge_image(image, mask)
-
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {oneapi_token}"
@@ -129,11 +131,12 @@ class KouTuNode:
         payload = {
             "model": "auto_koutu_1.0",
             "seed": seed, 
-            "imagem": mig_base64
         }
+        # 图像和遮罩单遍编码，传输格式由模型的 mask_format 决定
+        payload.update(ImageConverter.encode_masked_image(image, mask, "imagem", model="auto_koutu_1.0"))
 
         try:
-            response = requests.post(oneapi_url, headers=headers, json=payload, timeout=300)
+            response = http_client.post(oneapi_url, headers=headers, json=payload, timeout=300)
             # 判断状态码是否为 200
             if response.status_code != 200:
                 error_msg = ImageConverter.get_status_error_msg(response)
@@ -147,7 +150,7 @@ class KouTuNode:
             if not result_url:
                 raise ValueError("API返回空图像数据.")
 
-            responseurl = requests.get(result_url)
+            responseurl = http_client.get(result_url)
             if responseurl.status_code != 200:
                 raise ValueError("从 URL 获取图片失败。")
             
@@ -205,11 +208,8 @@ class ViduT2VNode:
                 "Content-Type": "application/json",
                 "Authorization": f"Bearer {oneapi_token}"
             }
-            response = requests.post(oneapi_url, headers=headers, json=payload, timeout=400)
-
-            response.raise_for_status()
-
-            result = response.json()
+            # 提交任务并等待结果（异步任务模式下为提交后轮询）
+            result = video_jobs.run(oneapi_url, headers, payload, timeout=400)
             print(result)
 
             video_url = result.get('creations', [])[0].get('url', '')
@@ -253,10 +253,10 @@ class ViduI2VNode:
         # 获取配置
         oneapi_url, oneapi_token = config_manager.get_api_config()
         images = []
-        first_image_base64 = ImageConverter.tensor_to_base64(first_image)
+        first_image_base64 = ImageConverter.tensor_to_base64(first_image, model="vidui2vNode")
         images.append(first_image_base64)
         if last_image is not None:
-            last_image_base64 = ImageConverter.tensor_to_base64(last_image)
+            last_image_base64 = ImageConverter.tensor_to_base64(last_image, model="vidui2vNode")
             images.append(last_image_base64)
         
         def call_api(seed_override):
@@ -276,11 +276,8 @@ class ViduI2VNode:
                 "Content-Type": "application/json",
                 "Authorization": f"Bearer {oneapi_token}"
             }
-            response = requests.post(oneapi_url, headers=headers, json=payload, timeout=400)
-
-            response.raise_for_status()
-
-            result = response.json()
+            # 提交任务并等待结果（异步任务模式下为提交后轮询）
+            result = video_jobs.run(oneapi_url, headers, payload, timeout=400)
             print(result)
 
             video_url =  result.get('creations', [])[0].get('url', '')
@@ -336,11 +333,8 @@ class DreaminaT2VNode:
                 "Content-Type": "application/json",
                 "Authorization": f"Bearer {oneapi_token}"
             }
-            response = requests.post(oneapi_url, headers=headers, json=payload, timeout=240)
-
-            response.raise_for_status()
-
-            result = response.json()
+            # 提交任务并等待结果（异步任务模式下为提交后轮询）
+            result = video_jobs.run(oneapi_url, headers, payload, timeout=240)
             print(result)
 
             video_url = result.get("content").get("video_url")
@@ -394,17 +388,14 @@ class HappyHorseTI2VNode:
                 "duration": duration,
             }
             if input_image is not None:
-                payload["input_image"] = ImageConverter.tensor_to_base64(input_image)
+                payload["input_image"] = ImageConverter.tensor_to_base64(input_image, model="HappyHorseTI2vNode")
 
             headers = {
                 "Content-Type": "application/json",
                 "Authorization": f"Bearer {oneapi_token}"
             }
-            response = requests.post(oneapi_url, headers=headers, json=payload, timeout=600)
-
-            response.raise_for_status()
-
-            result = response.json()
+            # 提交任务并等待结果（异步任务模式下为提交后轮询）
+            result = video_jobs.run(oneapi_url, headers, payload, timeout=600)
             print(result)
 
             video_url = result.get("video_url")
@@ -443,7 +434,7 @@ class HappyHorseReferenceNode:
     def generate(self, prompt, seed, Reference_image=[], resolution="720p", Size="16:9", duration=5):
         # 获取配置
         oneapi_url, oneapi_token = config_manager.get_api_config()
-        Reference_image_base64 = ImageConverter.convert_images_to_base64(Reference_image)
+        Reference_image_base64 = ImageConverter.convert_images_to_base64(Reference_image, model="HappyHorseReference")
         def call_api(seed_override):
             payload = {
                 "model": "HappyHorseReference",
@@ -458,10 +449,8 @@ class HappyHorseReferenceNode:
                 "Content-Type": "application/json",
                 "Authorization": f"Bearer {oneapi_token}"
             }
-            response = requests.post(oneapi_url, headers=headers, json=payload, timeout=600)
-
-            response.raise_for_status()
-            result = response.json()
+            # 提交任务并等待结果（异步任务模式下为提交后轮询）
+            result = video_jobs.run(oneapi_url, headers, payload, timeout=600)
             video_url = result.get("video_url")
             if not video_url:
                 raise ValueError("Empty video data from API.")
@@ -505,7 +494,7 @@ class DreaminaI2VNode:
     def generate(self, prompt, seed, first_image, resolution="1080p", Size="16:9", duration=10, camerafixed=False, last_image=None):
         # 获取配置
         oneapi_url, oneapi_token = config_manager.get_api_config()
-        first_image_base64 = ImageConverter.tensor_to_base64(first_image)
+        first_image_base64 = ImageConverter.tensor_to_base64(first_image, model="DreaminaI2VNode")
         def call_api(seed_override):
             payload = {
                 "model": "DreaminaI2VNode",
@@ -518,17 +507,14 @@ class DreaminaI2VNode:
                 "first_image_base64": first_image_base64,
             }
             if last_image is not None:
-                last_image_base64 = ImageConverter.tensor_to_base64(last_image)
+                last_image_base64 = ImageConverter.tensor_to_base64(last_image, model="DreaminaI2VNode")
                 payload["last_image_base64"] = last_image_base64
             headers = {
                 "Content-Type": "application/json",
                 "Authorization": f"Bearer {oneapi_token}"
             }
-            response = requests.post(oneapi_url, headers=headers, json=payload, timeout=240)
-
-            response.raise_for_status()
-
-            result = response.json()
+            # 提交任务并等待结果（异步任务模式下为提交后轮询）
+            result = video_jobs.run(oneapi_url, headers, payload, timeout=240)
             print(result)
 
             video_url = result.get("content").get("video_url")
@@ -553,7 +539,7 @@ class QwenImageNode:
             "required": {
                 "prompt": ("STRING", {"default": "A beautiful sunset", "multiline": True}),
                 "size": (["1328*1328", "1664*928", "1472*1140", "1140*1472", "928*1664"], {"default": "1328*1328"}),
-                "batch_size": ("INT", {"default": 1, "min": 1, "max": 2}),  # 新增参数，只能是1或2
+                "batch_size": ("INT", {"default": 1, "min": 1, "max": qwen_max_batch}),  # 生成张数，并发请求
                 "prompt_extend": ("BOOLEAN", {"default": True}),  # 是否开启prompt智能改写
                 "seed": ("INT", {"default": 0}),
             }
@@ -580,7 +566,7 @@ class QwenImageNode:
                 "Content-Type": "application/json",
                 "Authorization": f"Bearer {oneapi_token}"
             }
-            response = requests.post(oneapi_url, headers=headers, json=payload, timeout=60)
+            response = http_client.post(oneapi_url, headers=headers, json=payload, timeout=60)
             # 判断状态码是否为 200
             if response.status_code != 200:
                 error_msg = ImageConverter.get_status_error_msg(response,1)
@@ -592,7 +578,7 @@ class QwenImageNode:
             # 处理URL列表获取图片数据
             img_bytes_list = []
             url = result.get('output').get('results', [])[0].get('url', None)
-            response = requests.get(url)
+            response = http_client.get(url)
             response.raise_for_status()
             img_bytes_list.append(response.content)
             
@@ -606,8 +592,11 @@ class QwenImageNode:
         output_tensors = []
 
         try:
-            for i in range(batch_size):
-                img_tensor = call_api()
+            # batch 内的请求并发提交
+            results = parallel_map(lambda i: call_api(), range(batch_size), batch_size)
+            for i, img_tensor in enumerate(results):
+                if isinstance(img_tensor, Exception):
+                    raise img_tensor
                 if isinstance(img_tensor, torch.Tensor):
                     # 判断是否为错误图像 tensor
                     if img_tensor.shape[1] == 512 and img_tensor.shape[2] == 512 and img_tensor[0, 0, 0, 0] == 1:
@@ -631,7 +620,7 @@ class QwenImageEditNode:
             "required": {
                 "prompt": ("STRING", {"default": "", "multiline": True}),
                 "image": ("IMAGE",),  # 输入图像
-                "batch_size": ("INT", {"default": 1, "min": 1, "max": 2}),  # 新增参数，只能是1或2
+                "batch_size": ("INT", {"default": 1, "min": 1, "max": qwen_max_batch}),  # 生成张数，并发请求
                 "seed": ("INT", {"default": 0}),
             }
         }
@@ -645,7 +634,8 @@ class QwenImageEditNode:
         # 调用配置管理器获取配置
         oneapi_url, oneapi_token = config_manager.get_api_config()
 
-        image_base64 = ImageConverter.tensor_to_base64(image)
+        # 只编码一次，batch 内所有请求共用
+        image_base64 = ImageConverter.tensor_to_base64(image, model="qwen-image-edit")
 
         def call_api():
             payload = {
@@ -657,7 +647,7 @@ class QwenImageEditNode:
                 "Content-Type": "application/json",
                 "Authorization": f"Bearer {oneapi_token}"
             }
-            response = requests.post(oneapi_url, headers=headers, json=payload, timeout=60)
+            response = http_client.post(oneapi_url, headers=headers, json=payload, timeout=60)
             # 判断状态码是否为 200
             if response.status_code != 200:
                 error_msg = ImageConverter.get_status_error_msg(response,1)
@@ -669,7 +659,7 @@ class QwenImageEditNode:
             # 处理URL列表获取图片数据
             img_bytes_list = []
             url = result.get('output', {}).get('choices', [{}])[0].get('message', {}).get('content', [{}])[0].get('image', None)
-            response = requests.get(url)
+            response = http_client.get(url)
             response.raise_for_status()
             img_bytes_list.append(response.content)
             
@@ -683,8 +673,11 @@ class QwenImageEditNode:
         output_tensors = []
 
         try:
-            for i in range(batch_size):
-                img_tensor = call_api()
+            # batch 内的请求并发提交
+            results = parallel_map(lambda i: call_api(), range(batch_size), batch_size)
+            for i, img_tensor in enumerate(results):
+                if isinstance(img_tensor, Exception):
+                    raise img_tensor
                 if isinstance(img_tensor, torch.Tensor):
                     # 判断是否为错误图像 tensor
                     if img_tensor.shape[1] == 512 and img_tensor.shape[2] == 512 and img_tensor[0, 0, 0, 0] == 1:
@@ -723,7 +716,7 @@ class GetDressing:
         # 调用配置管理器获取配置
         oneapi_url, oneapi_token = config_manager.get_api_config()
 
-        mig_base64 = ImageConverter.tensor_to_base64(image)
+        mig_base64 = ImageConverter.tensor_to_base64(image, model="mojie_get_dressing")
 
         headers = {
             "Content-Type": "application/json",
@@ -745,7 +738,7 @@ class GetDressing:
         }
 
         try:
-            response = requests.post(oneapi_url, headers=headers, json=payload, timeout=300)
+            response = http_client.post(oneapi_url, headers=headers, json=payload, timeout=300)
             # 判断状态码是否为 200
             if response.status_code != 200:
                 error_msg = ImageConverter.get_status_error_msg(response)
@@ -759,7 +752,7 @@ class GetDressing:
             if not result_url:
                 raise ValueError("API返回空图像数据.")
 
-            responseurl = requests.get(result_url)
+            responseurl = http_client.get(result_url)
             if responseurl.status_code != 200:
                 raise ValueError("从 URL 获取图片失败。")
             
@@ -815,11 +808,9 @@ class ViduNode:
                 "Content-Type": "application/json",
                 "Authorization": f"Bearer {oneapi_token}"
             }
-            response = requests.post(oneapi_url, headers=headers, json=payload, timeout=240)
-
-            response.raise_for_status()
-
-            result = response.json()
+            # 提交任务并等待结果（异步任务模式下为提交后轮询）
+            # 超时取最慢档位（1080P）的值，其余分辨率由 deadline.py 的超时表收紧到 240 秒
+            result = video_jobs.run(oneapi_url, headers, payload, timeout=400)
             print(result)
 
             video_url = result.get('creations', [])[0].get('url', '')
@@ -828,7 +819,7 @@ class ViduNode:
             return video_url
 
         # 将图像转换为Base64编码
-        binary_data_base64 = ImageConverter.convert_images_to_base64(images)
+        binary_data_base64 = ImageConverter.convert_images_to_base64(images, model="vidu_video")
 
         # 调用API
         video_url = call_api(0, binary_data_base64)
@@ -848,6 +839,9 @@ class ReplaceClothesNode:
                 "cloths_image": ("IMAGE",),  # 输入图像
                 "model_image": ("IMAGE",),  # 输入图像
                 "seed": ("INT", {"default": 0}),  # -1表示随机
+            },
+            "optional": {
+                "split_result": ("BOOLEAN", {"default": False}),  # 结果为拼图时只保留分割线右侧
             }
         }
 
@@ -856,7 +850,7 @@ class ReplaceClothesNode:
     FUNCTION = "generate"
     CATEGORY = "🎨MJapiparty/Product&tool"
 
-    def generate(self, cloths_image, model_image, seed):
+    def generate(self, cloths_image, model_image, seed, split_result=False):
         # 调用配置管理器获取配置
         oneapi_url, oneapi_token = config_manager.get_api_config()
 
@@ -884,8 +878,8 @@ class ReplaceClothesNode:
 
 
         imput_image = []
-        imput_image.append(ImageConverter.tensor_to_base64(model_image))
-        imput_image.append(ImageConverter.tensor_to_base64(cloths_image))
+        imput_image.append(ImageConverter.tensor_to_base64(model_image, model="dressV2ing_diffusion"))
+        imput_image.append(ImageConverter.tensor_to_base64(cloths_image, model="dressV2ing_diffusion"))
 
         headers = {
             "Content-Type": "application/json",
@@ -903,7 +897,7 @@ class ReplaceClothesNode:
         }
 
         try:
-            response = requests.post(oneapi_url, headers=headers, json=payload, timeout=300)
+            response = http_client.post(oneapi_url, headers=headers, json=payload, timeout=300)
             # 判断状态码是否为 200
             if response.status_code != 200:
                 error_msg = ImageConverter.get_status_error_msg(response)
@@ -917,14 +911,15 @@ class ReplaceClothesNode:
             if not result_url:
                 raise ValueError("API返回空图像数据.")
 
-            responseurl = requests.get(result_url)
+            responseurl = http_client.get(result_url)
             if responseurl.status_code != 200:
                 raise ValueError("从 URL 获取图片失败。")
             
             img_bytes = responseurl.content
             img = Image.open(BytesIO(img_bytes)).convert("RGB")
 
-            # img = ImageConverter.get_right_part_of_image(img)
+            if split_result:
+                img = ImageConverter.get_right_part_of_image(img)
             # 直接调用导入的 pil2tensor 函数
             tensor_img = ImageConverter.pil2tensor(img)
             output_tensors.append(tensor_img)
@@ -974,14 +969,14 @@ class GeminiEditNode:
             }
             # 如果有图像输入，加入到payload中
             if len(image_input) > 0:
-                binary_data_base64 = ImageConverter.convert_images_to_base64(image_input)
+                binary_data_base64 = ImageConverter.convert_images_to_base64(image_input, model="gemini-2.5-flash-image")
                 payload["input_image"] = binary_data_base64
 
             headers = {
                 "Content-Type": "application/json",
                 "Authorization": f"Bearer {oneapi_token}"
             }
-            response = requests.post(oneapi_url, headers=headers, json=payload, timeout=1200)
+            response = http_client.post(oneapi_url, headers=headers, json=payload, timeout=1200)
             # 判断状态码是否为 200
             print(f"Gemini API 响应状态码: {response.status_code}")
             if response.status_code != 200:
@@ -1003,20 +998,7 @@ class GeminiEditNode:
 
             api_tensors = []
             print(image_urls)
-            for image_url in image_urls:
-                if not image_url:
-                    continue
-                try:
-                    # 下载图片
-                    response = requests.get(image_url)
-                    response.raise_for_status()
-                    # 将图片数据转换为 PIL 图像对象
-                    img = Image.open(BytesIO(response.content)).convert("RGB")
-                    api_tensors.append(ImageConverter.pil2tensor(img))
-                except Exception as e:
-                    print(f"下载图片 {image_url} 失败: {str(e)}")
-                    error_tensor = ImageConverter.create_error_image("下载图片失败")
-                    api_tensors.append(error_tensor)
+            api_tensors.extend(ImageConverter.download_images(image_urls))
 
             if not api_tensors:
                 error_tensor = ImageConverter.create_error_image("未获取到有效图片 URL")
@@ -1080,24 +1062,24 @@ class DoubaoSeedreamNode:
         }
         # 如果有图像输入，加入到payload中
         if image_input is not None:
-            binary_data_base64 = ImageConverter.convert_images_to_base64(image_input)
+            binary_data_base64 = ImageConverter.convert_images_to_base64(image_input, model="doubao-seedream-4.5")
             payload["input_image"] = binary_data_base64
 
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {oneapi_token}"
         }
-        response = requests.post(oneapi_url, headers=headers, json=payload, timeout=1200)
-        # 判断状态码是否为 200
-        if response.status_code != 200:
-            error_msg = ImageConverter.get_status_error_msg(response)
+        try:
+            # 重启前相同输入的任务已完成时复用结果，不会重复提交
+            result = image_jobs.run(oneapi_url, headers, payload, timeout=1200)
+        except requests.exceptions.HTTPError as e:
+            # 判断状态码是否为 200
+            error_msg = ImageConverter.get_status_error_msg(e.response)
             print("错误信息",error_msg)
             output_tensors = []
             error_tensor = ImageConverter.create_error_image(error_msg)
             output_tensors.append(error_tensor)
             return (torch.cat(output_tensors, dim=0),)
-        response.raise_for_status()
-        result = response.json()
 
         # 从返回的结果中提取图片 URL
         res_url = result.get("res_url", "")
@@ -1105,28 +1087,14 @@ class DoubaoSeedreamNode:
             raise ValueError("未找到图片 URL")
         image_urls = res_url.split("|") if res_url else []
 
-        api_tensors = []
         print(image_urls)
-        for image_url in image_urls:
-            if not image_url:
-                continue
-            try:
-                # 下载图片
-                response = requests.get(image_url)
-                response.raise_for_status()
-                # 将图片数据转换为 PIL 图像对象
-                img = Image.open(BytesIO(response.content)).convert("RGB")
-                api_tensors.append(ImageConverter.pil2tensor(img))
-            except Exception as e:
-                print(f"下载图片 {image_url} 失败: {str(e)}")
-                error_tensor = ImageConverter.create_error_image("下载图片失败")
-                api_tensors.append(error_tensor)
+        # 多张大图直接解码进同一个批次，不再逐张转换后 torch.cat；已下载过的 URL 从结果缓存读取
+        api_tensors = ImageConverter.download_images(image_urls, as_batch=True)
 
-        if not api_tensors:
-            error_tensor = ImageConverter.create_error_image("未获取到有效图片 URL")
-            api_tensors.append(error_tensor)
+        if not len(api_tensors):
+            api_tensors = ImageConverter.create_error_image("未获取到有效图片 URL")
 
-        return (torch.cat(api_tensors, dim=0),)
+        return (api_tensors,)
 
 
 class ModelGenNode:
@@ -1152,6 +1120,7 @@ class ModelGenNode:
             "optional": {
                 "face_image": ("IMAGE", {"default": None}),  # 可选的图像输入
                 "prompt": ("STRING",{ "forceInput": True} ),
+                "crop_white": ("BOOLEAN", {"default": False}),  # 裁剪结果图上下白边
             }
         }
 
@@ -1160,11 +1129,11 @@ class ModelGenNode:
     FUNCTION = "generate"
     CATEGORY = "🎨MJapiparty/Product&tool"
 
-    def generate(self , seed, face_image=None, cloths_image=None,race_class="Asia",gender_class="woman",style_prompt="INS自拍风",Size="3:4",resolution="2K",prompt=""):
+    def generate(self , seed, face_image=None, cloths_image=None,race_class="Asia",gender_class="woman",style_prompt="INS自拍风",Size="3:4",resolution="2K",prompt="",crop_white=False):
         # 调用配置管理器获取配置
         oneapi_url, oneapi_token = config_manager.get_api_config()
 
-        cloths_image_base64 = ImageConverter.tensor_to_base64(cloths_image)
+        cloths_image_base64 = ImageConverter.tensor_to_base64(cloths_image, model="mojie-output-moter")
 
         races = {
             "亚裔": "Asia",
@@ -1191,7 +1160,7 @@ class ModelGenNode:
             if prompt:
                 payload["prompt"] = prompt
             if face_image is not None:
-                face_image_base64 = ImageConverter.tensor_to_base64(face_image)
+                face_image_base64 = ImageConverter.tensor_to_base64(face_image, model="mojie-output-moter")
                 payload["face_image"] = face_image_base64
                 payload["image_list"].append(face_image_base64)
 
@@ -1200,7 +1169,7 @@ class ModelGenNode:
                 "Content-Type": "application/json",
                 "Authorization": f"Bearer {oneapi_token}"
             }
-            response = requests.post(oneapi_url, headers=headers, json=payload, timeout=1200)
+            response = http_client.post(oneapi_url, headers=headers, json=payload, timeout=1200)
             # 判断状态码是否为 200
             if response.status_code != 200:
                 error_msg = ImageConverter.get_status_error_msg(response)
@@ -1215,12 +1184,13 @@ class ModelGenNode:
             if not image_url:
                 raise ValueError("未找到图片 URL")
             # 下载图片
-            response = requests.get(image_url)
+            response = http_client.get(image_url)
             response.raise_for_status()
             # 将图片数据转换为 PIL 图像对象
             img = Image.open(BytesIO(response.content)).convert("RGB")
             # 调用封装的函数裁剪白色边框
-            # img = ImageConverter.crop_white_borders(img)
+            if crop_white:
+                img = ImageConverter.crop_white_borders(img)
             return ImageConverter.pil2tensor(img)
 
         output_tensors = []
@@ -1282,7 +1252,7 @@ class MoterPoseNode:
                 "seed": int(seed_override),
                 "watermark": False,
                 "mount": out_batch,
-                "input_image": ImageConverter.tensor_to_base64(image_input),
+                "input_image": ImageConverter.tensor_to_base64(image_input, model="moter-pose-change"),
                 "style": style,
                 "prompt": prompt,
                 "resolution": resolution,
@@ -1292,7 +1262,7 @@ class MoterPoseNode:
                 "Content-Type": "application/json",
                 "Authorization": f"Bearer {oneapi_token}"
             }
-            response = requests.post(oneapi_url, headers=headers, json=payload, timeout=1200)
+            response = http_client.post(oneapi_url, headers=headers, json=payload, timeout=1200)
             # 判断状态码是否为 200
             if response.status_code != 200:
                 raise requests.exceptions.HTTPError(f"Request failed with status code {response.status_code}: {response.text}")
@@ -1311,20 +1281,7 @@ class MoterPoseNode:
 
             api_tensors = []
             print(image_urls)
-            for image_url in image_urls:
-                if not image_url:
-                    continue
-                try:
-                    # 下载图片
-                    response = requests.get(image_url)
-                    response.raise_for_status()
-                    # 将图片数据转换为 PIL 图像对象
-                    img = Image.open(BytesIO(response.content)).convert("RGB")
-                    api_tensors.append(ImageConverter.pil2tensor(img))
-                except Exception as e:
-                    print(f"下载图片 {image_url} 失败: {str(e)}")
-                    error_tensor = ImageConverter.create_error_image("下载图片失败")
-                    api_tensors.append(error_tensor)
+            api_tensors.extend(ImageConverter.download_images(image_urls))
 
             if not api_tensors:
                 error_tensor = ImageConverter.create_error_image("未获取到有效图片 URL")
@@ -1352,6 +1309,9 @@ class ImageTranslateNode:
                 "SourceLang": (["自动","阿拉伯语", "法语", "英语",  "加泰罗尼亚语", "葡萄牙语", "西班牙语", "荷兰语", "德语", "斯洛文尼亚语", "阿塞拜疆语", "孟加拉语", "俄语", "挪威语", "马来语", "中文", "中文 (繁体)", "捷克语", "斯洛伐克语", "波兰语", "匈牙利语", "越南语", "丹麦语", "芬兰语", "瑞典语", "印尼语", "希伯来语", "意大利语", "日语", "韩语", "泰米尔语", "泰语", "土耳其语"], {"default": "自动"}),
                 "TargetLang": (["英语","中文", "中文 (繁体)",   "日语", "韩语", "阿拉伯语", "葡萄牙语", "法语", "德语", "西班牙语", "印尼语", "意大利语", "马来语", "俄语", "泰语", "越南语"], {"default": "英语"}),
                 "seed": ("INT", {"default": 0}),
+            },
+            "optional": {
+                "concurrency": ("INT", {"default": 4, "min": 1, "max": 16}),  # 同时处理的图片数
             }
         }
 
@@ -1360,12 +1320,12 @@ class ImageTranslateNode:
     FUNCTION = "generate"
     CATEGORY = "🎨MJapiparty/Tools_api"
 
-    def generate(self, seed, image_input=[], modelid="default", SourceLang="auto", TargetLang="auto"):
+    def generate(self, seed, image_input=[], modelid="default", SourceLang="auto", TargetLang="auto", concurrency=4):
         # 调用配置管理器获取配置
         oneapi_url, oneapi_token = config_manager.get_api_config()
         
         def call(img):
-            binary_data_base64 = ImageConverter.tensor_to_base64(img)
+            binary_data_base64 = ImageConverter.tensor_to_base64(img, model="image_translate")
 
             payload = {
                 "model": "image_translate",
@@ -1380,15 +1340,12 @@ class ImageTranslateNode:
                 "Content-Type": "application/json",
                 "Authorization": f"Bearer {oneapi_token}"
             }
-            response = requests.post(oneapi_url, headers=headers, json=payload, timeout=1200)
+            response = http_client.post(oneapi_url, headers=headers, json=payload, timeout=1200)
             # 判断状态码是否为 200
             if response.status_code != 200:
                 error_msg = ImageConverter.get_status_error_msg(response)
                 print("错误信息",error_msg)
-                output_tensors = []
-                error_tensor = ImageConverter.create_error_image(error_msg)
-                output_tensors.append(error_tensor)
-                return (torch.cat(output_tensors, dim=0),)
+                return ImageConverter.create_error_image(error_msg)
             response.raise_for_status()
             result = response.json()
 
@@ -1398,23 +1355,23 @@ class ImageTranslateNode:
                 raise ValueError("未找到图片 URL")
             return res_url
 
-        api_tensors = []
-        for img in image_input:
-            try:
-                # 宽高
-                width, height = img.shape[2], img.shape[1]
-                print(f"图片宽高: {width}x{height}")
+        def process(img):
+            # 宽高
+            height, width = img.shape[0], img.shape[1]
+            print(f"图片宽高: {width}x{height}")
 
-                res_url = call(img)
-                response = requests.get(res_url)
-                response.raise_for_status()
-                # 将图片数据转换为 PIL 图像对象
-                img = Image.open(BytesIO(response.content)).convert("RGB")
-                api_tensors.append(ImageConverter.pil2tensor(img))
-            except Exception as e:
-                print(f"下载图片 {res_url} 失败: {str(e)}")
-                error_tensor = ImageConverter.create_error_image("下载图片失败")
-                api_tensors.append(error_tensor)
+            res_url = call(img)
+            if isinstance(res_url, torch.Tensor):
+                return res_url
+            return ImageConverter.download_images([res_url])[0]
+
+        # 每张图片独立提交，按输入顺序返回，单张失败不影响其他图片
+        api_tensors = []
+        for result in parallel_map(process, image_input, concurrency):
+            if isinstance(result, Exception):
+                print(f"图片翻译失败: {str(result)}")
+                result = ImageConverter.create_error_image("下载图片失败")
+            api_tensors.append(result)
 
         if not api_tensors:
             error_tensor = ImageConverter.create_error_image("未获取到有效图片 URL")
@@ -1430,6 +1387,9 @@ class ImageUpscaleNode:
                 "image_input": ("IMAGE", {"default": []}),  # 可选的图像输入
                 "seed": ("INT", {"default": 0}),
                 "multiple": (["x2", "x4", "x6"], {"default": "x2"}),
+            },
+            "optional": {
+                "concurrency": ("INT", {"default": 4, "min": 1, "max": 16}),  # 同时处理的图片数
             }
         }
 
@@ -1438,7 +1398,7 @@ class ImageUpscaleNode:
     FUNCTION = "generate"
     CATEGORY = "🎨MJapiparty/Tools_api"
 
-    def generate(self, seed, image_input=[], multiple="x2"):
+    def generate(self, seed, image_input=[], multiple="x2", concurrency=4):
 
             
         # 调用配置管理器获取配置
@@ -1453,7 +1413,7 @@ class ImageUpscaleNode:
         multiple = multiple_map[multiple]
 
         def call(img):
-            binary_data_base64 = ImageConverter.tensor_to_base64(img)
+            binary_data_base64 = ImageConverter.tensor_to_base64(img, model="image_upscale")
 
             payload = {
                 "model": "image_upscale",
@@ -1466,15 +1426,12 @@ class ImageUpscaleNode:
                 "Content-Type": "application/json",
                 "Authorization": f"Bearer {oneapi_token}"
             }
-            response = requests.post(oneapi_url, headers=headers, json=payload, timeout=1200)
+            response = http_client.post(oneapi_url, headers=headers, json=payload, timeout=1200)
             # 判断状态码是否为 200
             if response.status_code != 200:
                 error_msg = ImageConverter.get_status_error_msg(response)
                 print("错误信息",error_msg)
-                output_tensors = []
-                error_tensor = ImageConverter.create_error_image(error_msg)
-                output_tensors.append(error_tensor)
-                return (torch.cat(output_tensors, dim=0),)
+                return ImageConverter.create_error_image(error_msg)
             response.raise_for_status()
             result = response.json()
 
@@ -1484,79 +1441,49 @@ class ImageUpscaleNode:
                 raise ValueError("未找到图片 URL")
             return res_url
 
-        api_tensors = []
-        for img in image_input:
-            try:
+        def process(img):
+            # 获取图片尺寸
+            # print("处理图片...",len(img.shape))
+            height, width = img.shape[0], img.shape[1]
+            print(f"图片宽高: {width}x{height}")
+
+            # print("====== 图像输入调试 ======")
+            # print("类型:", type(img))
+
+            # if isinstance(img, torch.Tensor):
+            #     print("形状:", img.shape)
+            #     print("数据类型:", img.dtype)
+            #     print("值范围:", (float(img.min()), float(img.max())))
+            #     print("前10个像素值:", img.flatten()[:10])
+            # elif isinstance(img, list) or isinstance(img, tuple):
+            #     print("列表长度:", len(img))
+            #     if len(img) > 0 and isinstance(img[0], torch.Tensor):
+            #         print("第一个元素形状:", img[0].shape)
+            # else:
+            #     print("未知结构:", img)
+            # print("=========================")
+            
+            # 按模型输入预算调整尺寸（宽高在256到2048之间）
+            img = ImageConverter.fit_to_budget(img, "image_upscale")
+            new_height, new_width = img.shape[-3], img.shape[-2]
 
-                # 获取图片尺寸
-                # print("处理图片...",len(img.shape))
-                height, width = img.shape[0], img.shape[1]
-                print(f"图片宽高: {width}x{height}")
-
-                # print("====== 图像输入调试 ======")
-                # print("类型:", type(img))
-
-                # if isinstance(img, torch.Tensor):
-                #     print("形状:", img.shape)
-                #     print("数据类型:", img.dtype)
-                #     print("值范围:", (float(img.min()), float(img.max())))
-                #     print("前10个像素值:", img.flatten()[:10])
-                # elif isinstance(img, list) or isinstance(img, tuple):
-                #     print("列表长度:", len(img))
-                #     if len(img) > 0 and isinstance(img[0], torch.Tensor):
-                #         print("第一个元素形状:", img[0].shape)
-                # else:
-                #     print("未知结构:", img)
-                # print("=========================")
-                
-                # 检查图片尺寸是否满足要求
-                min_size = 256
-                max_size = 2048
-                
-                # 调整图片尺寸以满足要求
-                if width < min_size or height < min_size or width > max_size or height > max_size:
-                    # 计算缩放因子
-                    scale_factor = 1.0
-                    
-                    # 处理过小的情况
-                    if width < min_size or height < min_size:
-                        scale_factor = max(min_size / width, min_size / height)
-                    
-                    # 处理过大的情况
-                    new_width = int(width * scale_factor)
-                    new_height = int(height * scale_factor)
-                    if new_width > max_size or new_height > max_size:
-                        scale_factor = min(max_size / width, max_size / height)
-                    
-                    # 计算新的尺寸
-                    new_width = int(width * scale_factor)
-                    new_height = int(height * scale_factor)
-                    print(f"调整图片尺寸至: {new_width}x{new_height}")
-                    
-                    # 转换并调整尺寸
-                    pil_img = ImageConverter.tensor2pil(img)
-                    pil_img = pil_img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                    img = ImageConverter.pil2tensor(pil_img)
-                else:
-                    new_width = width
-                    new_height = height
-
-                # 如果宽高*multiple大于10240，就直接原图输出
-                if new_width * multiple > 10240 or new_height * multiple > 10240:
-                    print(f"图片尺寸 {new_width}x{new_height} 超过最大限制 10240x10240,直接输出原图")
-                    api_tensors.append(img)
-                    continue
-
-
-                res_url = call(img)
-                response = requests.get(res_url)
-                response.raise_for_status()
-                # 将图片数据转换为 PIL 图像对象
-                img = Image.open(BytesIO(response.content)).convert("RGB")
-                api_tensors.append(ImageConverter.pil2tensor(img))
-            except Exception as e:
-                error_tensor = ImageConverter.create_error_image("下载图片失败")
-                api_tensors.append(error_tensor)
+            # 如果宽高*multiple大于10240，就直接原图输出
+            if new_width * multiple > 10240 or new_height * multiple > 10240:
+                print(f"图片尺寸 {new_width}x{new_height} 超过最大限制 10240x10240,直接输出原图")
+                return img if img.dim() == 4 else img.unsqueeze(0)
+
+            res_url = call(img)
+            if isinstance(res_url, torch.Tensor):
+                return res_url
+            return ImageConverter.download_images([res_url])[0]
+
+        # 每张图片独立提交，按输入顺序返回，单张失败不影响其他图片
+        api_tensors = []
+        for result in parallel_map(process, image_input, concurrency):
+            if isinstance(result, Exception):
+                print(f"高清放大失败: {str(result)}")
+                result = ImageConverter.create_error_image("下载图片失败")
+            api_tensors.append(result)
 
         if not api_tensors:
             error_tensor = ImageConverter.create_error_image("未获取到有效图片 URL")
@@ -1569,7 +1496,7 @@ class FurniturePhotoNode:
     @classmethod
     def INPUT_TYPES(cls):
         url = "https://rf.mojieaigc.com/v1/styles"
-        response = requests.get(url)
+        response = http_client.get(url)
         response.raise_for_status()
         result = response.json()
         style_list = result.get('style', [])
@@ -1611,7 +1538,7 @@ class FurniturePhotoNode:
                 "seed": int(seed_override),
                 # "input_image": [input_image_base64],
             }
-            binary_data_base64 = ImageConverter.convert_images_to_base64(input_image)
+            binary_data_base64 = ImageConverter.convert_images_to_base64(input_image, model="furniture-photo")
             payload["input_image"] = binary_data_base64
             if prompt:
                 payload["prompt"] = prompt
@@ -1619,7 +1546,7 @@ class FurniturePhotoNode:
                 "Content-Type": "application/json",
                 "Authorization": f"Bearer {oneapi_token}"
             }
-            response = requests.post(oneapi_url, headers=headers, json=payload, timeout=340)
+            response = http_client.post(oneapi_url, headers=headers, json=payload, timeout=340)
             try:
                 response.raise_for_status()
             except requests.exceptions.HTTPError as e:
@@ -1665,20 +1592,7 @@ class FurniturePhotoNode:
             image_urls = image_url.split("|") if image_url else []
 
             print(image_urls)
-            for image_url in image_urls:
-                if not image_url:
-                    continue
-                try:
-                    # 下载图片
-                    response = requests.get(image_url)
-                    response.raise_for_status()
-                    # 将图片数据转换为 PIL 图像对象
-                    img = Image.open(BytesIO(response.content)).convert("RGB")
-                    output_tensors.append(ImageConverter.pil2tensor(img))
-                except Exception as e:
-                    print(f"下载图片 {image_url} 失败: {str(e)}")
-                    error_tensor = ImageConverter.create_error_image("下载图片失败")
-                    output_tensors.append(error_tensor)
+            output_tensors.extend(ImageConverter.download_images(image_urls))
             if not output_tensors:
                 error_tensor = ImageConverter.create_error_image("未获取到有效图片 URL")
                 output_tensors.append(error_tensor)
@@ -1725,7 +1639,7 @@ class SinotecdesginNode:
             if len(image_input) > 1:
                 raise ValueError(type,"最多只能输入1张图片")
 
-        binary_data_base64 = ImageConverter.convert_images_to_base64(image_input)
+        binary_data_base64 = ImageConverter.convert_images_to_base64(image_input, model="human_desgin")
         api_tensors = []
 
         payload = {
@@ -1743,7 +1657,7 @@ class SinotecdesginNode:
             "Content-Type": "application/json",
             "Authorization": f"Bearer {oneapi_token}"
         }
-        response = requests.post(oneapi_url, headers=headers, json=payload, timeout=1200)
+        response = http_client.post(oneapi_url, headers=headers, json=payload, timeout=1200)
         # 判断状态码是否为 200
         if response.status_code != 200:
             error_msg = ImageConverter.get_status_error_msg(response)
@@ -1760,25 +1674,8 @@ class SinotecdesginNode:
         if not res_url:
             raise ValueError("未找到图片 URL")
         res_urls = res_url.split("|")
-        for url in res_urls:
-            url = url.strip()
-            if not url:
-                continue
-            
-            # 为每个下载添加重试机制（2次重试）
-            for attempt in range(3):  # 1次初始尝试 + 2次重试
-                try:
-                    response = requests.get(url)
-                    response.raise_for_status()
-                    # 将图片数据转换为 PIL 图像对象
-                    img = Image.open(BytesIO(response.content)).convert("RGB")
-                    api_tensors.append(ImageConverter.pil2tensor(img))
-                    break  # 下载成功，跳出重试循环
-                except Exception as e:
-                    if attempt == 2:  # 最后一次尝试失败
-                        # 创建错误图片并添加到结果中
-                        error_tensor = ImageConverter.create_error_image(f"下载失败: {str(e)}")
-                        api_tensors.append(error_tensor)
+        # 并发下载，每个URL失败后自动重试
+        api_tensors.extend(ImageConverter.download_images(res_urls, error_text="下载失败: {error}"))
 
         if not api_tensors:
             error_tensor = ImageConverter.create_error_image("未获取到有效图片 URL")
@@ -1807,46 +1704,16 @@ class DetailPhotoNode:
         # 调用配置管理器获取配置
         oneapi_url, oneapi_token = config_manager.get_api_config()
         if input_image is not None:
-            # 将张量转换为PIL图像以获取尺寸
-            pil_image = ImageConverter.tensor2pil(input_image)
-            width, height = pil_image.size
-            # print(f"原始图片尺寸: 宽度={width}, 高度={height}")
-            
-            # 检查并调整图片尺寸，确保宽高在1280到4096之间
-            min_size, max_size = 1280, 4096
-            needs_resize = False
-            scale_factor = 1.0
-            
-            # 如果宽度或高度小于最小值，需要放大
-            if width < min_size or height < min_size:
-                # 计算放大比例，取两个方向中较大的比例
-                scale_factor = max(min_size / width, min_size / height)
-                needs_resize = True
-            
-            # 如果宽度或高度大于最大值，需要缩小
-            elif width > max_size or height > max_size:
-                # 计算缩小比例，取两个方向中较小的比例
-                scale_factor = min(max_size / width, max_size / height)
-                needs_resize = True
-            
-            # 如果需要调整尺寸
-            if needs_resize:
-                new_width = int(width * scale_factor)
-                new_height = int(height * scale_factor)
-                #print(f"调整图片尺寸: 宽度={new_width}, 高度={new_height}, 缩放比例={scale_factor:.2f}")
-                
-                # 使用LANCZOS重采样方法进行高质量缩放
-                pil_image = pil_image.resize((new_width, new_height), Image.LANCZOS)
-                
-                # 将调整后的PIL图像转换回张量
-                input_image = ImageConverter.pil2tensor(pil_image)
+            # 按模型输入预算调整尺寸，确保宽高在1280到4096之间
+            # 用句柄承载缩放结果，编码时直接使用缩放后的 PIL 图像，不再转回 tensor
+            input_image = ImageConverter.fit_to_budget(ImageHandle.of(input_image), "detail-photo")
             
             # 获取最终尺寸用于API请求
-            final_width, final_height = pil_image.size
+            final_width, final_height = input_image.size
             size = f"{final_width}x{final_height}"
             # print(f"最终图片尺寸: {size}")
         # 合并图像和遮罩
-        merged_image = ImageConverter.highlight_mask_with_rectangle(input_image, mask)
+        merged_image = ImageConverter.highlight_mask_with_rectangle(input_image, mask, model="detail-photo")
 
         payload = {
             "model": "detail-photo",
@@ -1863,7 +1730,7 @@ class DetailPhotoNode:
             "Content-Type": "application/json",
             "Authorization": f"Bearer {oneapi_token}"
         }
-        response = requests.post(oneapi_url, headers=headers, json=payload, timeout=1200)
+        response = http_client.post(oneapi_url, headers=headers, json=payload, timeout=1200)
         # 判断状态码是否为 200
         if response.status_code != 200:
             error_msg = ImageConverter.get_status_error_msg(response)
@@ -1883,20 +1750,7 @@ class DetailPhotoNode:
 
         api_tensors = []
         print(image_urls)
-        for image_url in image_urls:
-            if not image_url:
-                continue
-            try:
-                # 下载图片
-                response = requests.get(image_url)
-                response.raise_for_status()
-                # 将图片数据转换为 PIL 图像对象
-                img = Image.open(BytesIO(response.content)).convert("RGB")
-                api_tensors.append(ImageConverter.pil2tensor(img))
-            except Exception as e:
-                print(f"下载图片 {image_url} 失败: {str(e)}")
-                error_tensor = ImageConverter.create_error_image("下载图片失败")
-                api_tensors.append(error_tensor)
+        api_tensors.extend(ImageConverter.download_images(image_urls))
 
         if not api_tensors:
             error_tensor = ImageConverter.create_error_image("未获取到有效图片 URL")
@@ -1936,46 +1790,16 @@ class DetailJinNode:
         
         # 获取图片的长宽
         if input_image is not None:
-            # 将张量转换为PIL图像以获取尺寸
-            pil_image = ImageConverter.tensor2pil(input_image)
-            width, height = pil_image.size
-            # print(f"原始图片尺寸: 宽度={width}, 高度={height}")
-            
-            # 检查并调整图片尺寸，确保宽高在1280到4096之间
-            min_size, max_size = 1280, 4096
-            needs_resize = False
-            scale_factor = 1.0
-            
-            # 如果宽度或高度小于最小值，需要放大
-            if width < min_size or height < min_size:
-                # 计算放大比例，取两个方向中较大的比例
-                scale_factor = max(min_size / width, min_size / height)
-                needs_resize = True
-            
-            # 如果宽度或高度大于最大值，需要缩小
-            elif width > max_size or height > max_size:
-                # 计算缩小比例，取两个方向中较小的比例
-                scale_factor = min(max_size / width, max_size / height)
-                needs_resize = True
-            
-            # 如果需要调整尺寸
-            if needs_resize:
-                new_width = int(width * scale_factor)
-                new_height = int(height * scale_factor)
-                # print(f"调整图片尺寸: 宽度={new_width}, 高度={new_height}, 缩放比例={scale_factor:.2f}")
-                
-                # 使用LANCZOS重采样方法进行高质量缩放
-                pil_image = pil_image.resize((new_width, new_height), Image.LANCZOS)
-                
-                # 将调整后的PIL图像转换回张量
-                input_image = ImageConverter.pil2tensor(pil_image)
+            # 按模型输入预算调整尺寸，确保宽高在1280到4096之间
+            # 用句柄承载缩放结果，编码时直接使用缩放后的 PIL 图像，不再转回 tensor
+            input_image = ImageConverter.fit_to_budget(ImageHandle.of(input_image), "detail-jin")
             
             # 获取最终尺寸用于API请求
-            final_width, final_height = pil_image.size
+            final_width, final_height = input_image.size
             size = f"{final_width}x{final_height}"
             # print(f"最终图片尺寸: {size}")
         
-        merged_image = ImageConverter.tensor_to_base64(input_image)
+        merged_image = ImageConverter.tensor_to_base64(input_image, model="detail-jin")
 
         payload = {
             "model": "detail-jin",
@@ -1991,7 +1815,7 @@ class DetailJinNode:
             "Content-Type": "application/json",
             "Authorization": f"Bearer {oneapi_token}"
         }
-        response = requests.post(oneapi_url, headers=headers, json=payload, timeout=1200)
+        response = http_client.post(oneapi_url, headers=headers, json=payload, timeout=1200)
         # 判断状态码是否为 200
         if response.status_code != 200:
             error_msg = ImageConverter.get_status_error_msg(response)
@@ -2011,20 +1835,7 @@ class DetailJinNode:
 
         api_tensors = []
         print(image_urls)
-        for image_url in image_urls:
-            if not image_url:
-                continue
-            try:
-                # 下载图片
-                response = requests.get(image_url)
-                response.raise_for_status()
-                # 将图片数据转换为 PIL 图像对象
-                img = Image.open(BytesIO(response.content)).convert("RGB")
-                api_tensors.append(ImageConverter.pil2tensor(img))
-            except Exception as e:
-                print(f"下载图片 {image_url} 失败: {str(e)}")
-                error_tensor = ImageConverter.create_error_image("下载图片失败")
-                api_tensors.append(error_tensor)
+        api_tensors.extend(ImageConverter.download_images(image_urls))
 
         if not api_tensors:
             error_tensor = ImageConverter.create_error_image("未获取到有效图片 URL")
@@ -2060,9 +1871,9 @@ class FurnitureAngleNode:
         # 调用配置管理器获取配置
         oneapi_url, oneapi_token = config_manager.get_api_config()
         # 合并图像和遮罩
-        merged_image = [ImageConverter.tensor_to_base64(input_image)]
+        merged_image = [ImageConverter.tensor_to_base64(input_image, model="furniture-angle")]
         if reference_image is not None:
-            reference_image = ImageConverter.convert_images_to_base64(reference_image)
+            reference_image = ImageConverter.convert_images_to_base64(reference_image, model="furniture-angle")
             merged_image = merged_image + reference_image
             
         def cell(num):
@@ -2080,7 +1891,7 @@ class FurnitureAngleNode:
                 "Content-Type": "application/json",
                 "Authorization": f"Bearer {oneapi_token}"
             }
-            response = requests.post(oneapi_url, headers=headers, json=payload, timeout=1200)
+            response = http_client.post(oneapi_url, headers=headers, json=payload, timeout=1200)
             # 判断状态码是否为 200
             if response.status_code != 200:
                 error_msg = ImageConverter.get_status_error_msg(response)
@@ -2099,20 +1910,7 @@ class FurnitureAngleNode:
             image_urls = res_url.split("|") if res_url else []
 
             print(image_urls)
-            for image_url in image_urls:
-                if not image_url:
-                    continue
-                try:
-                    # 下载图片
-                    response = requests.get(image_url)
-                    response.raise_for_status()
-                    # 将图片数据转换为 PIL 图像对象
-                    img = Image.open(BytesIO(response.content)).convert("RGB")
-                    api_tensors.append(ImageConverter.pil2tensor(img))
-                except Exception as e:
-                    print(f"下载图片 {image_url} 失败: {str(e)}")
-                    error_tensor = ImageConverter.create_error_image("下载图片失败")
-                    api_tensors.append(error_tensor)
+            api_tensors.extend(ImageConverter.download_images(image_urls))
         api_tensors = []
         cell(1)
         if not api_tensors:
@@ -2164,35 +1962,15 @@ class NanoProNode:
             if input_images is None and aspect_ratio == "auto":
                 payload["aspect_ratio"] = "1:1"
             if input_images is not None:
-                # 检查图像长边是否大于1280，如果是则等比压缩
-                compressed_images = []
-                for img in input_images:
-                    # 将张量转换为PIL图像
-                    pil_image = ImageConverter.tensor2pil(img)
-                    if pil_image is not None:
-                        # 检查长边
-                        width, height = pil_image.size
-                        max_size = max(width, height)
-                        
-                        if max_size > 1280:
-                            # 计算缩放比例
-                            scale = 1280 / max_size
-                            new_width = int(width * scale)
-                            new_height = int(height * scale)
-                            # 使用高质量的重采样方法进行缩放
-                            pil_image = pil_image.resize((new_width, new_height), Image.LANCZOS)
-                        
-                        # 将处理后的图像转换回张量
-                        compressed_tensor = ImageConverter.pil2tensor(pil_image)
-                        compressed_images.append(compressed_tensor)
-                
-                input_image_base64 = ImageConverter.convert_images_to_base64(compressed_images)
+                # 按模型输入预算等比压缩（长边不超过1280）
+                input_image_base64 = ImageConverter.convert_images_to_base64(input_images, model="nano-banana-pro")
                 payload["input_image"] = input_image_base64
             headers = {
                 "Content-Type": "application/json",
                 "Authorization": f"Bearer {oneapi_token}"
             }
-            response = requests.post(oneapi_url, headers=headers, json=payload, timeout=300)
+            # 超时取最慢档位（4K）的值，其余分辨率由 deadline.py 的超时表收紧到 300 秒
+            response = http_client.post(oneapi_url, headers=headers, json=payload, timeout=600)
             if response.status_code != 200:
                 error_msg = ImageConverter.get_status_error_msg(response)
                 print("错误信息",error_msg)
@@ -2210,20 +1988,7 @@ class NanoProNode:
             image_urls = image_url.split("|") if image_url else []
 
             print(image_urls)
-            for image_url in image_urls:
-                if not image_url:
-                    continue
-                try:
-                    # 下载图片
-                    response = requests.get(image_url)
-                    response.raise_for_status()
-                    # 将图片数据转换为 PIL 图像对象
-                    img = Image.open(BytesIO(response.content)).convert("RGB")
-                    output_tensors.append(ImageConverter.pil2tensor(img))
-                except Exception as e:
-                    print(f"下载图片 {image_url} 失败: {str(e)}")
-                    error_tensor = ImageConverter.create_error_image("下载图片失败")
-                    output_tensors.append(error_tensor)
+            output_tensors.extend(ImageConverter.download_images(image_urls))
             if not output_tensors:
                 error_tensor = ImageConverter.create_error_image("未获取到有效图片 URL")
                 output_tensors.append(error_tensor)
@@ -2278,14 +2043,14 @@ class Flux2Node:
             if input_images is None and aspect_ratio == "auto":
                 payload["aspect_ratio"] = "4:3"
             if input_images is not None:
-                input_image_base64 = ImageConverter.convert_images_to_base64(input_images)
+                input_image_base64 = ImageConverter.convert_images_to_base64(input_images, model="flux2")
                 payload["input_image"] = input_image_base64
 
             headers = {
                 "Content-Type": "application/json",
                 "Authorization": f"Bearer {oneapi_token}"
             }
-            response = requests.post(oneapi_url, headers=headers, json=payload, timeout=1200)
+            response = http_client.post(oneapi_url, headers=headers, json=payload, timeout=1200)
             # 判断状态码是否为 200
             if response.status_code != 200:
                 error_msg = ImageConverter.get_status_error_msg(response)
@@ -2304,20 +2069,7 @@ class Flux2Node:
             image_urls = res_url.split("|") if res_url else []
 
             print(image_urls)
-            for image_url in image_urls:
-                if not image_url:
-                    continue
-                try:
-                    # 下载图片
-                    response = requests.get(image_url)
-                    response.raise_for_status()
-                    # 将图片数据转换为 PIL 图像对象
-                    img = Image.open(BytesIO(response.content)).convert("RGB")
-                    api_tensors.append(ImageConverter.pil2tensor(img))
-                except Exception as e:
-                    print(f"下载图片 {image_url} 失败: {str(e)}")
-                    error_tensor = ImageConverter.create_error_image("下载图片失败")
-                    api_tensors.append(error_tensor)
+            api_tensors.extend(ImageConverter.download_images(image_urls))
         api_tensors = []
         cell(1)
         if not api_tensors:
@@ -2429,11 +2181,17 @@ class GeminiLLMNode:
         
         # 获取配置
         oneapi_url, oneapi_token = config_manager.get_api_config()
+        MODEL_MAPPING = {
+            "Gemini 3 Pro Preview": "Gemini-3-Pro-Preview",
+            "Gemini 3 Flash Preview": "Gemini-3-Flash-Preview",
+            "Gemini 3.1 Pro Preview": "Gemini-3.1-Pro-Preview",
+        }
+        modelr = MODEL_MAPPING.get(model, model)
         # 处理图片输入
         input_image_base64 = None
         if image_input is not None:
             try:
-                input_image_base64 = ImageConverter.convert_images_to_base64(image_input)
+                input_image_base64 = ImageConverter.convert_images_to_base64(image_input, model=modelr)
                 if not input_image_base64:
                     return ("错误：图片转换为base64失败",)
             except Exception as e:
@@ -2467,12 +2225,6 @@ class GeminiLLMNode:
         print(f"处理媒体文件数量: 图片{len(input_image_base64) if input_image_base64 else 0}张, 视频帧{len(video_base64) if video_base64 else 0}帧, 文件{len(file_base64) if file_base64 else 0}个")
         
         def call_api(seed_override):
-            MODEL_MAPPING = {
-                "Gemini 3 Pro Preview": "Gemini-3-Pro-Preview",
-                "Gemini 3 Flash Preview": "Gemini-3-Flash-Preview",
-                "Gemini 3.1 Pro Preview": "Gemini-3.1-Pro-Preview",
-            }
-            modelr = MODEL_MAPPING.get(model, model)
             print("=== 准备调用API ===")
             # 构建payload，包含所有参数
             nonlocal conversation_history  # 允许在内部函数中修改外部变量
@@ -2527,7 +2279,7 @@ class GeminiLLMNode:
             }
             print(f"正在调用API: {oneapi_url}")
             print(f"API调用超时设置: 240秒")
-            response = requests.post(oneapi_url, headers=headers, json=payload, timeout=300)
+            response = http_client.post(oneapi_url, headers=headers, json=payload, timeout=300)
             print(f"API调用完成，状态码: {response.status_code}")
 
             response.raise_for_status()
@@ -2559,6 +2311,8 @@ class GeminiLLMNode:
             return (restext,conversation_history)
         except requests.exceptions.RequestException as e:
             print(f"=== API调用失败 ===")
+            # 以文字返回错误，告知 memo 不缓存本次结果
+            ImageConverter.record_error()
             print(f"错误类型: 请求异常")
             print(f"错误详情: {str(e)}")
             if hasattr(e, 'response') and e.response is not None:
@@ -2581,6 +2335,8 @@ class GeminiLLMNode:
                 return (white_tensor, f"API调用失败，请稍后重试")
         except Exception as e:
             print(f"=== GeminiLLMNode 执行失败 ===")
+            # 以文字返回错误，告知 memo 不缓存本次结果
+            ImageConverter.record_error()
             print(f"错误类型: 其他异常")
             print(f"错误详情: {str(e)}")
             # 返回错误信息作为字符串
@@ -2648,40 +2404,21 @@ class Gemini3NanoNode:
         if model != "Gemini 2.5 Flash Image":
             payload["thinking_level"] = thinking_level 
         if input_images is not None:
-            # 检查图像长边是否大于1280，如果是则等比压缩
-            compressed_images = []
-            for img in input_images:
-                # 将张量转换为PIL图像
-                pil_image = ImageConverter.tensor2pil(img)
-                if pil_image is not None:
-                    # 检查长边
-                    width, height = pil_image.size
-                    max_size = max(width, height)
-                    
-                    if max_size > 1280:
-                        # 计算缩放比例
-                        scale = 1280 / max_size
-                        new_width = int(width * scale)
-                        new_height = int(height * scale)
-                        # 使用高质量的重采样方法进行缩放
-                        pil_image = pil_image.resize((new_width, new_height), Image.LANCZOS)
-                    
-                    # 将处理后的图像转换回张量
-                    compressed_tensor = ImageConverter.pil2tensor(pil_image)
-                    compressed_images.append(compressed_tensor)
-            
-            input_image_base64 = ImageConverter.convert_images_to_base64(compressed_images)
+            # 按模型输入预算等比压缩（长边不超过1280）
+            input_image_base64 = ImageConverter.convert_images_to_base64(input_images, model=modelr)
             payload["input_image"] = input_image_base64
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {oneapi_token}"
         }
         try:
-            response = requests.post(oneapi_url, headers=headers, json=payload, timeout=300)
+            response = http_client.post(oneapi_url, headers=headers, json=payload, timeout=300)
 
             response.raise_for_status()
         except requests.exceptions.RequestException as e:
             print(f"=== API调用失败 ===")
+            # 以文字返回错误，告知 memo 不缓存本次结果
+            ImageConverter.record_error()
             print(f"错误类型: 请求异常")
             print(f"错误详情: {str(e)}")
             # 创建一个纯白色的图片
@@ -2730,21 +2467,7 @@ class Gemini3NanoNode:
 
         image_urls = image_url.split("|") if image_url else []
         print(image_urls)
-        for image_url in image_urls:
-            if not image_url:
-                continue
-            try:
-                # 下载图片
-                response = requests.get(image_url)
-                response.raise_for_status()
-                # 将图片数据转换为 PIL 图像对象
-                from PIL import Image
-                img = Image.open(BytesIO(response.content)).convert("RGB")
-                output_tensors.append(ImageConverter.pil2tensor(img))
-            except Exception as e:
-                print(f"下载图片 {image_url} 失败: {str(e)}")
-                error_tensor = ImageConverter.create_error_image("下载图片失败")
-                output_tensors.append(error_tensor)
+        output_tensors.extend(ImageConverter.download_images(image_urls))
         if not output_tensors:
             error_tensor = ImageConverter.create_error_image("未获取到有效图片 URL")
             output_tensors.append(error_tensor)
@@ -2898,8 +2621,8 @@ class ChangeHeadNode:
     def generate(self, seed, source_head=None, replac_head=None, num_images=1):
         # 调用配置管理器获取配置
         oneapi_url, oneapi_token = config_manager.get_api_config()
-        source_head = ImageConverter.tensor_to_base64(source_head)
-        replac_head = ImageConverter.tensor_to_base64(replac_head)
+        source_head = ImageConverter.tensor_to_base64(source_head, model="change_head")
+        replac_head = ImageConverter.tensor_to_base64(replac_head, model="change_head")
         
         payload = {
             "model": "change_head",
@@ -2912,7 +2635,7 @@ class ChangeHeadNode:
             "Content-Type": "application/json",
             "Authorization": f"Bearer {oneapi_token}"
         }
-        response = requests.post(oneapi_url, headers=headers, json=payload, timeout=1200)
+        response = http_client.post(oneapi_url, headers=headers, json=payload, timeout=1200)
         # 判断状态码是否为 200
         if response.status_code != 200:
             error_msg = ImageConverter.get_status_error_msg(response)
@@ -2932,20 +2655,7 @@ class ChangeHeadNode:
 
         api_tensors = []
         print(image_urls)
-        for image_url in image_urls:
-            if not image_url:
-                continue
-            try:
-                # 下载图片
-                response = requests.get(image_url)
-                response.raise_for_status()
-                # 将图片数据转换为 PIL 图像对象
-                img = Image.open(BytesIO(response.content)).convert("RGB")
-                api_tensors.append(ImageConverter.pil2tensor(img))
-            except Exception as e:
-                print(f"下载图片 {image_url} 失败: {str(e)}")
-                error_tensor = ImageConverter.create_error_image("下载图片失败")
-                api_tensors.append(error_tensor)
+        api_tensors.extend(ImageConverter.download_images(image_urls))
 
         if not api_tensors:
             error_tensor = ImageConverter.create_error_image("未获取到有效图片 URL")
@@ -2975,7 +2685,8 @@ class MultiImageUpload:
 
     def load(self, filenames, max_size=1024, image1=None, image2=None):
         input_dir = folder_paths.get_input_directory()
-        pil_images = []
+        # (H, W, C) 的 tensor 或 uint8 数组，按输出顺序排列
+        images = []
 
         # 1. 处理可选的外部图片输入 (image1, image2) - 确保image1排在第一位
         external_images = []
@@ -2987,10 +2698,7 @@ class MultiImageUpload:
         for ext_img in external_images:
             # ext_img 形状为 (B, H, W, C)，需遍历批次中的每一张
             for i in range(ext_img.shape[0]):
-                single_tensor = ext_img[i]  # (H, W, C)
-                # 转换为 PIL 图像
-                pil_img = ImageConverter.tensor2pil(single_tensor)
-                pil_images.append(pil_img)
+                images.append(ext_img[i, ..., :3])
 
         # 2. 处理上传的图片文件
         if filenames:
@@ -2999,27 +2707,69 @@ class MultiImageUpload:
                 img_path = os.path.join(input_dir, name)
                 if not os.path.exists(img_path):
                     raise FileNotFoundError(f"Image not found: {img_path}")
-                pil_images.append(Image.open(img_path).convert("RGB"))
+                images.append(np.asarray(Image.open(img_path).convert("RGB")))
 
-        if not pil_images:
+        if not images:
             raise ValueError("No images provided (neither upload nor external inputs).")
 
         # 3. 统一处理所有图片：等比缩放 + 白边填充至 max_size × max_size
-        processed_tensors = []
-        for img in pil_images:
-            resized_img = ImageConverter.resize_image(img, max_size, "keep_ratio_pad")
-            tensor = ImageConverter.pil2tensor(resized_img)  # (1, max_size, max_size, 3)
-            processed_tensors.append(tensor)
-
-        # 4. 合并为批次
-        if processed_tensors:
-            batch_tensor = torch.cat(processed_tensors, dim=0)
-        else:
-            batch_tensor = torch.empty(0)
+        # 相同尺寸的图片归为一组，每组一次向量化缩放，结果直接写入预分配的批次
+        batch_tensor = torch.empty((len(images), max_size, max_size, 3), dtype=torch.float32)
+        groups = {}
+        for index, img in enumerate(images):
+            groups.setdefault((isinstance(img, np.ndarray), tuple(img.shape)), []).append(index)
+        for indices in groups.values():
+            group = [images[i] for i in indices]
+            if isinstance(group[0], np.ndarray):
+                # 上传文件已是 uint8，直接整组缩放
+                stacked = torch.from_numpy(np.stack(group))
+            else:
+                stacked = torch.stack([img.detach().cpu() for img in group])
+            if indices == list(range(indices[0], indices[-1] + 1)):
+                # 连续的一组直接写入批次切片
+                ImageConverter.resize_pad_batch(stacked, max_size, out=batch_tensor[indices[0]:indices[-1] + 1])
+            else:
+                batch_tensor[indices] = ImageConverter.resize_pad_batch(stacked, max_size)
 
         return (batch_tensor,)
 
 
+class ImagePostProcessNode:
+    """图片后处理：找到拼图分割线保留右侧部分，和/或裁剪上下白边"""
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "image": ("IMAGE",),
+                "mode": (["裁剪上下白边", "保留分割线右侧", "保留右侧并裁剪白边"], {"default": "裁剪上下白边"}),
+                "tolerance": ("INT", {"default": 30, "min": 0, "max": 255}),  # 白色容差
+            }
+        }
+
+    RETURN_TYPES = ("IMAGE",)
+    RETURN_NAMES = ("image",)
+    FUNCTION = "process"
+    CATEGORY = "🎨MJapiparty/Product&tool"
+
+    def process(self, image, mode="裁剪上下白边", tolerance=30):
+        frames = []
+        for frame in ImageConverter.split_batch(image):
+            array = ImageConverter.tensor_to_uint8(frame)
+            if mode != "裁剪上下白边":
+                array = array[:, ImageConverter.find_split_column(array):]
+            if mode != "保留分割线右侧":
+                top, bottom = ImageConverter.find_white_borders(array, tolerance)
+                array = array[top:bottom]
+            frames.append(ImageConverter.pil2tensor(array))
+
+        # 批次中各张裁剪后尺寸不同时，用白色补齐到最大尺寸
+        height = max(frame.shape[1] for frame in frames)
+        width = max(frame.shape[2] for frame in frames)
+        frames = [
+            torch.nn.functional.pad(frame, (0, 0, 0, width - frame.shape[2], 0, height - frame.shape[1]), value=1.0)
+            for frame in frames
+        ]
+        return (torch.cat(frames, dim=0),)
 
 
 class GPT_Image_2_Node:
@@ -3073,40 +2823,21 @@ class GPT_Image_2_Node:
             "conversation_history": conversation_history,  # 发送API请求时带上上下文数据
         }
         if input_images is not None:
-            # 检查图像长边是否大于1280，如果是则等比压缩
-            compressed_images = []
-            for img in input_images:
-                # 将张量转换为PIL图像
-                pil_image = ImageConverter.tensor2pil(img)
-                if pil_image is not None:
-                    # 检查长边
-                    width, height = pil_image.size
-                    max_size = max(width, height)
-                    
-                    if max_size > 1280:
-                        # 计算缩放比例
-                        scale = 1280 / max_size
-                        new_width = int(width * scale)
-                        new_height = int(height * scale)
-                        # 使用高质量的重采样方法进行缩放
-                        pil_image = pil_image.resize((new_width, new_height), Image.LANCZOS)
-                    
-                    # 将处理后的图像转换回张量
-                    compressed_tensor = ImageConverter.pil2tensor(pil_image)
-                    compressed_images.append(compressed_tensor)
-            
-            input_image_base64 = ImageConverter.convert_images_to_base64(compressed_images)
+            # 按模型输入预算等比压缩（长边不超过1280）
+            input_image_base64 = ImageConverter.convert_images_to_base64(input_images, model=model_dict[model])
             payload["input_image"] = input_image_base64
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {oneapi_token}"
         }
         try:
-            response = requests.post(oneapi_url, headers=headers, json=payload, timeout=300)
+            response = http_client.post(oneapi_url, headers=headers, json=payload, timeout=300)
 
             response.raise_for_status()
         except requests.exceptions.RequestException as e:
             print(f"=== API调用失败 ===")
+            # 以文字返回错误，告知 memo 不缓存本次结果
+            ImageConverter.record_error()
             print(f"错误类型: 请求异常")
             print(f"错误详情: {str(e)}")
             # 创建一个纯白色的图片
@@ -3151,21 +2882,7 @@ class GPT_Image_2_Node:
                 raise ValueError("模型未回复")
         image_urls = image_url.split("|") if image_url else []
         print(image_urls)
-        for image_url in image_urls:
-            if not image_url:
-                continue
-            try:
-                # 下载图片
-                response = requests.get(image_url)
-                response.raise_for_status()
-                # 将图片数据转换为 PIL 图像对象
-                from PIL import Image
-                img = Image.open(BytesIO(response.content)).convert("RGB")
-                output_tensors.append(ImageConverter.pil2tensor(img))
-            except Exception as e:
-                print(f"下载图片 {image_url} 失败: {str(e)}")
-                error_tensor = ImageConverter.create_error_image("下载图片失败")
-                output_tensors.append(error_tensor)
+        output_tensors.extend(ImageConverter.download_images(image_urls))
         if not output_tensors:
             error_tensor = ImageConverter.create_error_image("未获取到有效图片 URL")
             output_tensors.append(error_tensor)
@@ -3204,11 +2921,17 @@ NODE_CLASS_MAPPINGS = {
     "SinotecdesginNode": SinotecdesginNode,
     "ChangeHeadNode": ChangeHeadNode,
     "MultiImageUpload": MultiImageUpload,
+    "ImagePostProcessNode": ImagePostProcessNode,
     "GPT_Image_2_Node": GPT_Image_2_Node,
     "HappyHorseTI2VNode": HappyHorseTI2VNode,
     "HappyHorseReferenceNode": HappyHorseReferenceNode,
 }
 
+# 按 config.ini [MEMO] 为指定节点启用输入记忆化；每次节点执行使用独立的超时预算
+for _name, _node_class in NODE_CLASS_MAPPINGS.items():
+    memoizer.wrap(_name, _node_class)
+    deadline_policy.wrap(_node_class)
+
 NODE_DISPLAY_NAME_MAPPINGS = {
     "GeminiEditNode": "Gemini-Nano-1图片编辑",
     "NanoProNode": "Gemini-Nano-2-pro图片编辑",
@@ -3241,6 +2964,7 @@ NODE_DISPLAY_NAME_MAPPINGS = {
     "SinotecdesginNode": "人设设计",
     "ChangeHeadNode": "头像替换",
     "MultiImageUpload": "多图上传",
+    "ImagePostProcessNode": "图片后处理(分割/去白边)",
     "GPT_Image_2_Node": "GPT-Image-2",
     "HappyHorseTI2VNode": "HappyHorse-图片文字生视频",
     "HappyHorseReferenceNode": "HappyHorse-参考生视频",
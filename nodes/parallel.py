@@ -0,0 +1,33 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from .deadline import deadline_scope
+
+
+def parallel_map(func, items, max_workers=4):
+    """
+    在有界线程池中并发执行 func(item)，按输入顺序返回结果
+    单项抛出的异常不会影响其他项，异常对象会原样放在对应位置，由调用方决定如何处理
+
+    :param func: 处理单个元素的函数
+    :param items: 输入列表
+    :param max_workers: 最大并发数，<=1 时退化为串行执行
+    :return: 与 items 等长、顺序一致的结果列表
+    """
+    items = list(items)
+
+    def run(item):
+        try:
+            # 每项独立计算超时预算（见 deadline.py），批量中靠后的项不会因前面的项耗时而超时
+            with deadline_scope():
+                return func(item)
+        except Exception as e:
+            return e
+
+    if max_workers <= 1 or len(items) <= 1:
+        return [run(item) for item in items]
+
+    # 工作线程继承调用方的上下文（如外层的超时预算、错误图片计数），每项一份副本
+    contexts = [contextvars.copy_context() for _ in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(lambda context, item: context.run(run, item), contexts, items))
@@ -0,0 +1,154 @@
+import time
+import copy
+import random
+import logging
+from email.utils import parsedate_to_datetime
+
+import requests
+from urllib3.exceptions import NewConnectionError
+
+from .config import ConfigManager
+
+
+class RetryPolicy:
+    """
+    统一的重试策略：区分可重试的状态码和网络错误，按指数退避 + 随机抖动等待，遵守 Retry-After，
+    同时限制总尝试次数和总耗时。
+    非幂等的提交请求（POST 生成任务）只在确定服务端没有处理时才重试：连接没有建立、
+    或服务端明确拒绝（429/503/408），避免对可能已经扣费的任务盲目重复提交。
+    """
+
+    # 幂等请求（GET 下载、状态查询）可重试的状态码
+    RETRY_STATUS = (408, 425, 429, 500, 502, 503, 504)
+    # 提交请求可重试的状态码：服务端明确表示请求未被处理
+    SAFE_SUBMIT_STATUS = (408, 429, 503)
+    IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+    def __init__(self, max_attempts=4, base_delay=1.0, max_delay=30.0, max_elapsed=120.0, sleep=time.sleep):
+        """
+        :param max_attempts: 最大尝试次数（含第一次），<=1 时不重试
+        :param base_delay: 第一次重试的退避基数（秒），之后每次翻倍
+        :param max_delay: 单次等待的上限（秒），Retry-After 超过此值时直接放弃重试
+        :param max_elapsed: 从第一次请求开始允许重试的总时长（秒）
+        :param sleep: 等待函数（便于替换）
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_elapsed = max_elapsed
+        self.sleep = sleep
+
+    @classmethod
+    def from_config(cls, config_manager=None):
+        config_manager = config_manager or ConfigManager()
+        return cls(**config_manager.get_retry_config())
+
+    def replace(self, **kwargs):
+        """返回修改了部分参数的副本"""
+        policy = copy.copy(self)
+        for key, value in kwargs.items():
+            setattr(policy, key, value)
+        policy.max_attempts = max(1, policy.max_attempts)
+        return policy
+
+    @staticmethod
+    def retry_after(response):
+        """解析 Retry-After（秒数或 HTTP 日期），没有或无法解析时返回 None"""
+        if response is None:
+            return None
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        value = value.strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def backoff(self, attempt):
+        """第 attempt 次重试（从 0 开始）的等待时间：full jitter，在 [0, base * 2^attempt] 内随机"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def is_retryable_status(self, status_code, idempotent=True):
+        return status_code in (self.RETRY_STATUS if idempotent else self.SAFE_SUBMIT_STATUS)
+
+    @staticmethod
+    def is_retryable_error(error, idempotent=True):
+        """
+        网络错误是否可重试
+        连接阶段失败（请求未发出）总是可以重试；读超时、连接中途断开时请求可能已被处理，只有幂等请求才重试
+        """
+        if isinstance(error, requests.exceptions.HTTPError):
+            return False
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        if isinstance(error, requests.exceptions.ConnectionError):
+            # 连接被拒绝、DNS 失败等，请求没有到达服务端
+            reason = error.args[0] if error.args else None
+            reason = getattr(reason, "reason", reason)
+            if isinstance(reason, NewConnectionError):
+                return True
+            return idempotent
+        if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ChunkedEncodingError)):
+            return idempotent
+        return False
+
+    def call(self, func, idempotent=True, description="", retry_error=None, deadline=None):
+        """
+        执行 func() 并按策略重试
+        func 返回 requests.Response 时按状态码判断是否重试，重试用尽后返回最后一次的响应，由调用方照常处理；
+        func 抛出异常时按异常类型判断，重试用尽后抛出最后一次的异常
+
+        :param func: 无参函数，发起一次请求
+        :param idempotent: 请求是否幂等（重复执行没有副作用）
+        :param description: 日志中的请求描述
+        :param retry_error: 可选函数 retry_error(error) -> bool，额外指定可重试的异常（如下载中途解码失败）
+        :param deadline: 可选的 Deadline，等待后会超出截止时间时不再重试
+        """
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            response, error = None, None
+            try:
+                result = func()
+            except Exception as e:
+                error = e
+                response = getattr(e, "response", None)
+                retryable = self.is_retryable_error(e, idempotent) or (retry_error is not None and retry_error(e))
+                if isinstance(e, requests.exceptions.HTTPError) and response is not None:
+                    retryable = self.is_retryable_status(response.status_code, idempotent)
+            else:
+                if not isinstance(result, requests.Response) or not self.is_retryable_status(result.status_code, idempotent):
+                    return result
+                response = result
+                retryable = True
+
+            attempt += 1
+            delay = None
+            if retryable and attempt < self.max_attempts:
+                delay = self.backoff(attempt - 1)
+                retry_after = self.retry_after(response)
+                if retry_after is not None:
+                    # 服务端要求的等待时间优先；超过单次上限说明短时间内不会恢复，不再重试
+                    delay = retry_after if retry_after <= self.max_delay else None
+                if delay is not None and time.monotonic() - start + delay > self.max_elapsed:
+                    delay = None
+                if delay is not None and deadline is not None and deadline.remaining() <= delay:
+                    delay = None
+            if delay is None:
+                if error is not None:
+                    raise error
+                return response
+
+            reason = f"状态码 {response.status_code}" if error is None else str(error)
+            logging.warning(f"[RetryPolicy] {description} 第 {attempt} 次请求失败（{reason}），{delay:.1f} 秒后重试")
+            if response is not None:
+                # 释放连接，避免重试时占满连接池
+                response.close()
+            self.sleep(delay)
+
+
+# 所有 HTTP 请求共享的默认重试策略
+retry_policy = RetryPolicy.from_config()